@@ -0,0 +1,279 @@
+import os
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+SEQUENCE_KEY = 'two-tier:sequence'
+JOURNAL_KEY = 'two-tier:journal:{}'
+_missing = object()
+
+
+def _fresh_sequence():
+    # Счётчик журнала, заведённый заново после вытеснения из L2,
+    # начинается со случайного значения: процессы видят разрыв
+    # больше L1_MAX_ENTRIES и очищают L1 целиком.
+    return random.getrandbits(62)
+
+
+class AtomicFileBasedCache(FileBasedCache):
+    """Файловый кэш, в котором add и incr атомарны между процессами
+    одной машины: обе операции выполняются под блокировкой файла."""
+
+    lock_name = 'cache.lock'
+
+    @contextmanager
+    def _locked(self):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_name), 'ab') as file:
+            locks.lock(file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(file)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._locked():
+            return super().incr(key, delta, version)
+
+
+class TwoTierCache(BaseCache):
+    """Ограниченный LRU-кэш процесса (L1) перед общим кэшем (L2).
+
+    LOCATION - имя общего кэша в settings.CACHES. Каждая запись
+    публикует изменённый ключ в журнале L2; процессы сверяются
+    с журналом не чаще SYNC_INTERVAL секунд и вытесняют из L1
+    ключи, изменённые другими процессами. Для нескольких процессов
+    L2 должен атомарно выполнять incr и add (Redis, Memcached,
+    AtomicFileBasedCache на одной машине)."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('L1_TIMEOUT', 60)
+        self._sync_interval = options.get('SYNC_INTERVAL', 0)
+        self._journal_timeout = options.get('JOURNAL_TIMEOUT', 60 * 60)
+        self._local = OrderedDict()
+        self._lock = threading.RLock()
+        self._seen = None
+        self._synced_at = 0
+        self._stats = dict.fromkeys(
+            ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses', 'l2_syncs'), 0
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    @property
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _shared_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # L1
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _missing
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return _missing
+            self._local.move_to_end(key)
+            return pickle.loads(value)
+
+    def _local_set(self, key, value, timeout):
+        if timeout is not None and timeout <= 0:
+            self._local_forget(key)
+            return
+        ttl = self._local_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[key] = (value, time.monotonic() + ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _local_forget(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    # Журнал изменений в L2
+
+    def _publish(self, *keys):
+        self._sync()
+        shared = self.shared
+        for key in keys:
+            try:
+                sequence = shared.incr(SEQUENCE_KEY)
+            except ValueError:
+                self._reset_sequence()
+                sequence = shared.incr(SEQUENCE_KEY)
+            shared.set(JOURNAL_KEY.format(sequence), key,
+                       self._journal_timeout)
+            with self._lock:
+                if self._seen == sequence - 1:
+                    self._seen = sequence
+
+    def _reset_sequence(self):
+        # Изменения до вытеснения счётчика неизвестны: процесс,
+        # заведший новый счётчик, очищает свой L1 и следит с его начала.
+        start = _fresh_sequence()
+        if self.shared.add(SEQUENCE_KEY, start, None):
+            with self._lock:
+                self._local.clear()
+                self._seen = start
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        self._synced_at = now
+        self._count('l2_syncs')
+        head = self.shared.get(SEQUENCE_KEY, 0)
+        with self._lock:
+            seen = self._seen
+            if seen == head:
+                return
+            self._seen = head
+        if seen is None or head < seen or head - seen > self._max_entries:
+            with self._lock:
+                self._local.clear()
+            return
+        journal = [JOURNAL_KEY.format(n) for n in range(seen + 1, head + 1)]
+        changed = self.shared.get_many(journal)
+        with self._lock:
+            if len(changed) < len(journal):
+                self._local.clear()
+                return
+            for key in changed.values():
+                self._local.pop(key, None)
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._sync()
+        value = self._local_get(key)
+        if value is not _missing:
+            self._count('l1_hits')
+            return value
+        self._count('l1_misses')
+        value = self.shared.get(key, _missing)
+        if value is _missing:
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        self._local_set(key, value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        self._sync()
+        found = {}
+        for key, original in made.items():
+            value = self._local_get(key)
+            if value is not _missing:
+                found[original] = value
+        self._count('l1_hits', len(found))
+        rest = [key for key, original in made.items()
+                if original not in found]
+        self._count('l1_misses', len(rest))
+        shared = self.shared.get_many(rest) if rest else {}
+        self._count('l2_hits', len(shared))
+        self._count('l2_misses', len(rest) - len(shared))
+        for key, value in shared.items():
+            self._local_set(key, value, None)
+            found[made[key]] = value
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        timeout = self._shared_timeout(timeout)
+        self.shared.set(key, value, timeout)
+        self._publish(key)
+        self._local_set(key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._shared_timeout(timeout)
+        made = {self.make_key(key, version=version): value
+                for key, value in data.items()}
+        failed = self.shared.set_many(made, timeout)
+        self._publish(*made)
+        for key, value in made.items():
+            self._local_set(key, value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        timeout = self._shared_timeout(timeout)
+        added = self.shared.add(key, value, timeout)
+        if added:
+            self._publish(key)
+            self._local_set(key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self._local_forget(key)
+        return self.shared.touch(key, self._shared_timeout(timeout))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self.shared.incr(key, delta)
+        self._local_forget(key)
+        self._publish(key)
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.shared.delete(key)
+        self._local_forget(key)
+        self._publish(key)
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        if not made:
+            return
+        self.shared.delete_many(made)
+        for key in made:
+            self._local_forget(key)
+        self._publish(*made)
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._local.clear()
+            self._seen = None
@@ -0,0 +1,28 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TempCacheRunner(DiscoverRunner):
+    """Запуск тестов с файловыми кэшами в своём временном каталоге:
+    тесты не читают и не портят рабочий кэш на диске."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, params in caches.items():
+            if params['BACKEND'].endswith('FileBasedCache'):
+                params['LOCATION'] = os.path.join(self.cache_dir, alias)
+        self.cache_override = override_settings(CACHES=caches)
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
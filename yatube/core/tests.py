@@ -1,6 +1,17 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
 from http import HTTPStatus
-from django.test import TestCase
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
+from django.utils.http import http_date
+
+from core.cache import SEQUENCE_KEY, AtomicFileBasedCache, TwoTierCache
+from core.views import parse_range
 
 INDEX_URL = reverse('posts:index')
 UNEXISTING_URL = '/unexisting_page'
@@ -11,3 +22,245 @@ class CustomErrorPagesTest(TestCase):
         response = self.client.get(UNEXISTING_URL)
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+MEDIA_FILE = 'posts/ab/photo.jpg'
+MEDIA_CONTENT = bytes(range(256)) * 4
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def media_url(path=MEDIA_FILE):
+    return reverse('media', kwargs={'path': path})
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_OFFLOAD=None)
+class MediaViewTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        path = os.path.join(MEDIA_ROOT, MEDIA_FILE)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as file:
+            file.write(MEDIA_CONTENT)
+        cls.last_modified = http_date(os.stat(path).st_mtime)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_file_served_with_cache_headers(self):
+        """Файл отдаётся целиком с долгим кэшем и Last-Modified."""
+        response = self.client.get(media_url())
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), MEDIA_CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(MEDIA_CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Last-Modified'], self.last_modified)
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_range_served_partially(self):
+        """Запрошенный диапазон отдаётся ответом 206."""
+        response = self.client.get(media_url(), HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content),
+                         MEDIA_CONTENT[10:20])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(MEDIA_CONTENT)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_stale_if_range_serves_whole_file(self):
+        """If-Range с другой датой отменяет диапазон."""
+        response = self.client.get(
+            media_url(), HTTP_RANGE='bytes=10-19',
+            HTTP_IF_RANGE=http_date(0),
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_unsatisfiable_range(self):
+        """Диапазон за концом файла даёт 416."""
+        response = self.client.get(media_url(), HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes */{len(MEDIA_CONTENT)}')
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_not_modified(self):
+        """If-Modified-Since с текущей датой файла даёт 304."""
+        response = self.client.get(
+            media_url(), HTTP_IF_MODIFIED_SINCE=self.last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_missing_and_outside_files(self):
+        """Несуществующие файлы и пути вне MEDIA_ROOT дают 404."""
+        for path in ('posts/missing.jpg', '../etc/passwd', 'posts'):
+            with self.subTest(path=path):
+                response = self.client.get(media_url(path))
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_post_not_allowed(self):
+        response = self.client.post(media_url())
+        self.assertEqual(response.status_code,
+                         HTTPStatus.METHOD_NOT_ALLOWED)
+
+    @override_settings(MEDIA_OFFLOAD='x-accel-redirect',
+                       MEDIA_ACCEL_PREFIX='/protected/')
+    def test_accel_redirect(self):
+        """С X-Accel-Redirect файл не читается, его отдаёт nginx."""
+        response = self.client.get(media_url())
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected/{MEDIA_FILE}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    @override_settings(MEDIA_OFFLOAD='x-sendfile')
+    def test_sendfile(self):
+        response = self.client.get(media_url())
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(MEDIA_ROOT, MEDIA_FILE))
+        self.assertEqual(response.content, b'')
+
+    def test_parse_range(self):
+        cases = {
+            'bytes=0-0': (0, 0),
+            'bytes=10-': (10, 99),
+            'bytes=-10': (90, 99),
+            'bytes=-500': (0, 99),
+            'bytes=50-500': (50, 99),
+            'bytes=20-10': None,
+            'bytes=0-1,5-6': None,
+            'items=0-1': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range(header, 100)
+
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared-test': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared-test',
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TwoTierCacheTest(SimpleTestCase):
+    def worker(self, **options):
+        return TwoTierCache('shared-test', {'OPTIONS': options})
+
+    def setUp(self):
+        caches['shared-test'].clear()
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Повторное чтение обслуживает L1 без обращения к L2."""
+        writer, reader = self.worker(), self.worker()
+        writer.set('key', 'value')
+        self.assertEqual(reader.get('key'), 'value')
+        self.assertEqual(reader.get('key'), 'value')
+        self.assertEqual(reader.stats, {
+            'l1_hits': 1, 'l1_misses': 1, 'l2_hits': 1, 'l2_misses': 0,
+            'l2_syncs': 2,
+        })
+
+    def test_writes_reach_other_workers(self):
+        """Запись, удаление и incr в одном процессе вытесняют
+        устаревшее значение из L1 другого."""
+        writer, reader = self.worker(), self.worker()
+        writer.set('key', 1)
+        self.assertEqual(reader.get('key'), 1)
+        writer.set('key', 2)
+        self.assertEqual(reader.get('key'), 2)
+        writer.incr('key')
+        self.assertEqual(reader.get('key'), 3)
+        writer.delete('key')
+        self.assertIsNone(reader.get('key'))
+
+    def test_local_tier_is_bounded(self):
+        """L1 вытесняет давно не читанные ключи."""
+        cache = self.worker(L1_MAX_ENTRIES=2)
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(cache.stats['l1_hits'], 2)
+        self.assertEqual(cache.stats['l2_hits'], 1)
+
+    def test_local_tier_expires(self):
+        """Запись в L1 живёт не дольше L1_TIMEOUT."""
+        cache = self.worker(L1_TIMEOUT=0.01)
+        cache.set('key', 'value')
+        time.sleep(0.02)
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.stats['l2_hits'], 1)
+
+    def test_sync_interval_bounds_staleness(self):
+        """Внутри SYNC_INTERVAL L1 может отдать устаревшее значение
+        без чтения журнала; после интервала видит изменение."""
+        writer = self.worker()
+        reader = self.worker(SYNC_INTERVAL=0.05)
+        writer.set('key', 1)
+        self.assertEqual(reader.get('key'), 1)
+        writer.set('key', 2)
+        self.assertEqual(reader.get('key'), 1)
+        self.assertEqual(reader.stats['l2_syncs'], 1)
+        time.sleep(0.06)
+        self.assertEqual(reader.get('key'), 2)
+        self.assertEqual(reader.stats['l2_syncs'], 2)
+
+    def test_sequence_reset_clears_local_tier(self):
+        """Если счётчик журнала вытеснен из L2, процессы не пропускают
+        изменения, записанные после его пересоздания."""
+        writer, reader = self.worker(), self.worker()
+        writer.set('key', 1)
+        self.assertEqual(reader.get('key'), 1)
+        caches['shared-test'].delete(SEQUENCE_KEY)
+        writer.set('key', 2)
+        self.assertEqual(reader.get('key'), 2)
+
+
+class AtomicFileBasedCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, True)
+
+    def run_threads(self, target, count=8):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def cache(self):
+        return AtomicFileBasedCache(self.location, {})
+
+    def test_incr_is_atomic(self):
+        self.cache().set('counter', 0)
+
+        def increment():
+            cache = self.cache()
+            for _ in range(25):
+                cache.incr('counter')
+
+        self.run_threads(increment)
+        self.assertEqual(self.cache().get('counter'), 200)
+
+    def test_add_has_single_winner(self):
+        added = []
+
+        def add():
+            added.append(self.cache().add('lock', 1))
+
+        self.run_threads(add)
+        self.assertEqual(added.count(True), 1)
@@ -1,4 +1,21 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified, StreamingHttpResponse)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CACHEABLE_STATUSES = (200, 206, 304)
 
 
 def page_not_found(request, exception):
@@ -7,3 +24,119 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def parse_range(header, size):
+    """(начало, конец) единственного диапазона байт из заголовка Range.
+
+    None - заголовок не разобран и файл отдаётся целиком,
+    ValueError - диапазон целиком за пределами файла."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if not length or not size:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+def read_range(path, start, end, block_size=FileResponse.block_size):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        left = end - start + 1
+        while left > 0:
+            chunk = file.read(min(block_size, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            yield chunk
+
+
+def offload(path, fullpath):
+    """Ответ без тела: файл отдаёт фронтовой прокси."""
+    response = HttpResponse()
+    if settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(path)
+        )
+    else:
+        response['X-Sendfile'] = fullpath
+    # Тип и длину выставляет прокси по самому файлу.
+    del response['Content-Type']
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Файлы MEDIA_ROOT с поддержкой Range и If-Modified-Since.
+
+    Имена загрузок не меняются вместе с содержимым, поэтому ответы
+    кэшируются надолго. При MEDIA_OFFLOAD байты отдаёт прокси."""
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        raise Http404(path)
+    last_modified = http_date(stat.st_mtime)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_OFFLOAD:
+        response = offload(path, fullpath)
+    else:
+        response = file_response(request, fullpath, stat.st_size,
+                                 last_modified)
+    response['Last-Modified'] = last_modified
+    # Ответ 416 и прочие ошибки прокси не должны кэшировать надолго.
+    if response.status_code in CACHEABLE_STATUSES:
+        patch_cache_control(response, public=True,
+                            max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def file_response(request, fullpath, size, last_modified):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    header = request.META.get('HTTP_RANGE')
+    byte_range = None
+    # If-Range с другой датой: файл изменился, отдаём его целиком.
+    if header and request.META.get('HTTP_IF_RANGE', last_modified) == (
+        last_modified
+    ):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(fullpath, start, end),
+            status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        # FileResponse отдаёт файл через wsgi.file_wrapper (sendfile),
+        # если сервер его поддерживает.
+        response = FileResponse(open(fullpath, 'rb'),
+                                content_type=content_type)
+        response['Content-Length'] = size
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
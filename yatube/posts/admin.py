@@ -1,9 +1,15 @@
 from django.contrib import admin
 
+from . import thumbnails
+from .forms import PostForm
 from .models import Post, Group, Comment, Follow
+from .search import search_queryset
 
 
 class PostAdmin(admin.ModelAdmin):
+    # Картинка проверяется и обрабатывается так же, как на сайте.
+    form = PostForm
+    fields = ('text', 'author', 'group', 'image')
     list_display = ('pk',
                     'text',
                     'pub_date',
@@ -15,6 +21,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по обратному индексу вместо LIKE по всем текстам.
+        if not search_term.strip():
+            return queryset, False
+        return search_queryset(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        thumbnails.schedule_on_commit(obj.image)
+
 
 class GroupAdmin(admin.ModelAdmin):
     search_fields = ('text', 'group',)
@@ -0,0 +1,225 @@
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+
+
+def version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def modified_key(scope):
+    return f'feed-modified:{scope}'
+
+
+def _fresh_version():
+    # Версия, созданная заново после вытеснения ключа из кэша,
+    # не должна совпасть ни с одной из выданных раньше.
+    return int(time.time() * 1000)
+
+
+def feed_version(*scopes):
+    """Составная версия лент: меняется после любой записи,
+    затрагивающей хотя бы одну из них."""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_feeds(*scopes):
+    for scope in set(scopes):
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            cache.set(version_key(scope), _fresh_version(), None)
+    cache.set_many({modified_key(scope): time.time() for scope in scopes},
+                   None)
+
+
+def feed_modified(*scopes):
+    """Время последней записи в ленты или None, если оно неизвестно."""
+    modified = cache.get_many([modified_key(scope) for scope in scopes])
+    if len(modified) < len(scopes):
+        return None
+    return datetime.fromtimestamp(max(modified.values()), timezone.utc)
+
+
+def post_scopes(post, *group_ids):
+    """Ленты, в которых показывается пост."""
+    scopes = ['index', f'author:{post.author_id}']
+    scopes += [f'group:{pk}' for pk in group_ids + (post.group_id,) if pk]
+    return scopes
+
+
+def feed_context(*scopes):
+    """Контекст для {% cache feed_timeout ... feed_version %} в шаблонах."""
+    return {
+        'feed_version': feed_version(*scopes),
+        'feed_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def _needs_refresh(entry, version):
+    # Вероятностное раннее обновление: чем дольше строилось значение
+    # и чем ближе истечение, тем вероятнее пересборка до него.
+    built_version, _, delta, expires = entry
+    if built_version != version:
+        return True
+    return time.time() - delta * math.log(random.random() or 1e-12) >= expires
+
+
+def single_flight(key, version, build, timeout):
+    """Значение из кэша, пересобираемое одним исполнителем.
+
+    Пока один процесс держит блокировку и строит новое значение,
+    остальные получают устаревшее, а если его нет - ждут результат."""
+    entry = cache.get(key)
+    if entry is not None and not _needs_refresh(entry, version):
+        return entry[1]
+    lock = f'{key}:lock'
+    if cache.add(lock, version, settings.FEED_LOCK_TIMEOUT):
+        try:
+            started = time.monotonic()
+            value = build()
+            delta = time.monotonic() - started
+            # Устаревшая копия живёт ещё один срок, чтобы было что
+            # отдать, пока строится новая.
+            cache.set(key, (version, value, delta, time.time() + timeout),
+                      timeout * 2)
+        finally:
+            cache.delete(lock)
+        return value
+    if entry is not None:
+        return entry[1]
+    deadline = time.monotonic() + settings.FEED_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.FEED_LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+    return build()
+
+
+def page_key(request, view_name):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'feed-page:{view_name}:{request.user.pk or 0}:{path}'
+
+
+def cache_feed(*scopes):
+    """Кэш страницы ленты под её версией: запись в ленту сразу
+    даёт новую версию, а пересобирает страницу только один запрос."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            built = []
+
+            def build():
+                response = view(request, *args, **kwargs)
+                built.append(response)
+                cacheable = (response.status_code == 200
+                             and not response.streaming
+                             and not response.cookies)
+                return response if cacheable else None
+
+            response = single_flight(
+                page_key(request, view.__name__),
+                feed_version(*scopes),
+                build,
+                settings.FEED_CACHE_TIMEOUT,
+            )
+            if response is None:
+                return built[0] if built else view(request, *args, **kwargs)
+            return response
+        return wrapper
+    return decorator
+
+
+def feed_condition(get_scopes):
+    """ETag и Last-Modified страницы по версиям её лент.
+
+    get_scopes(request, *args, **kwargs) возвращает ленты страницы
+    или None, если объекта нет. Ответ 304 отдаётся без рендера.
+    Для вошедших пользователей ETag привязан к сессии и CSRF-куке,
+    а Last-Modified не отдаётся."""
+    def scopes(request, *args, **kwargs):
+        if not hasattr(request, '_feed_scopes'):
+            request._feed_scopes = get_scopes(request, *args, **kwargs)
+        return request._feed_scopes
+
+    def etag(request, *args, **kwargs):
+        found = scopes(request, *args, **kwargs)
+        if found is None:
+            return None
+        tag = f'{request.user.pk or 0}:{feed_version(*found)}'
+        if request.user.is_authenticated:
+            # Страница содержит CSRF-токен, который меняется при входе:
+            # после повторного входа старая копия не годится.
+            tag += ':{}:{}'.format(
+                request.session.session_key,
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            )
+        return hashlib.md5(tag.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        # По одной дате нельзя отличить копию из прошлой сессии.
+        if request.user.is_authenticated:
+            return None
+        found = scopes(request, *args, **kwargs)
+        return feed_modified(*found) if found else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def missing_key(model, **lookup):
+    (field, value), = lookup.items()
+    digest = hashlib.md5(str(value).encode()).hexdigest()
+    return f'missing:{model._meta.label_lower}:{field}:{digest}'
+
+
+def missing_cache():
+    # Отдельный ограниченный кэш: поток промахов от обходчиков
+    # не вытесняет версии лент и не пишет в журнал TwoTierCache.
+    return caches[settings.MISSING_CACHE_ALIAS]
+
+
+def is_missing(model, **lookup):
+    return missing_cache().get(missing_key(model, **lookup)) is not None
+
+
+def remember_missing(model, **lookup):
+    missing_cache().set(missing_key(model, **lookup), True,
+                        settings.MISSING_CACHE_TIMEOUT)
+
+
+def forget_missing(model, **lookups):
+    missing_cache().delete_many([
+        missing_key(model, **{field: value})
+        for field, value in lookups.items()
+    ])
+
+
+def get_or_404(queryset, **lookup):
+    """get_object_or_404 по одному полю с кэшем промахов:
+    повторный запрос несуществующего объекта не идёт в базу."""
+    model = getattr(queryset, 'model', queryset)
+    if is_missing(model, **lookup):
+        raise Http404(f'No {model._meta.object_name} matches the query.')
+    try:
+        return get_object_or_404(queryset, **lookup)
+    except Http404:
+        remember_missing(model, **lookup)
+        raise
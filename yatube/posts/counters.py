@@ -0,0 +1,57 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _shift(field, delta):
+    # Не уходим ниже нуля, даже если счётчик разошёлся с данными:
+    # такой дрейф чинит команда recount_counters.
+    return {field: Greatest(F(field) + delta, Value(0))}
+
+
+def bump_user(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    # Уменьшение не создаёт строку: при каскадном удалении пользователя
+    # его UserStats уже удалены, и новая строка ссылалась бы на него.
+    if not stats.update(**_shift(field, delta)) and delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        stats.update(**_shift(field, delta))
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        **_shift('comments_count', delta)
+    )
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            **_shift('posts_count', delta)
+        )
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def recount():
+    """Пересчитывает все счётчики по фактическим данным."""
+    UserStats.objects.bulk_create(
+        UserStats(user_id=user_id)
+        for user_id in User.objects.filter(
+            stats__isnull=True
+        ).values_list('pk', flat=True)
+    )
+    UserStats.objects.update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
+    Group.objects.update(posts_count=_count(Post.objects, 'group'))
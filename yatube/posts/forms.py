@@ -1,9 +1,42 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .groups import registry
 from .models import Post, Comment
+from .uploads import (describe_image, is_too_large, process_image,
+                      validate_upload_size)
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = self.fields['group']
+        field.choices = registry.choices(field.empty_label)
+        # Слишком большой файл обрезан при загрузке и не прошёл бы
+        # проверку картинки: убираем его и отклоняем в clean_image.
+        name = self.add_prefix('image')
+        self.oversized_image = self.files.get(name)
+        if self.oversized_image and is_too_large(self.oversized_image):
+            self.files = self.files.copy()
+            del self.files[name]
+        else:
+            self.oversized_image = None
+
+    def clean_image(self):
+        if self.oversized_image:
+            validate_upload_size(self.oversized_image)
+        image = self.cleaned_data.get('image')
+        post = self.instance
+        if isinstance(image, UploadedFile):
+            image = process_image(image)
+            post.image_width, post.image_height, post.image_placeholder = (
+                describe_image(image)
+            )
+        elif not image:
+            post.image_width = post.image_height = None
+            post.image_placeholder = ''
+        return image
+
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
@@ -0,0 +1,64 @@
+import threading
+
+from django.http import Http404
+
+from .cache import feed_version
+from .models import Group
+
+SCOPE = 'groups'
+
+
+class GroupRegistry:
+    """Все группы в памяти процесса с индексами по slug и id.
+
+    Групп немного, и меняются они редко: реестр загружается одним
+    запросом и перечитывается, когда сигнал Group меняет версию
+    'groups' в общем кэше, в том числе в другом процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_slug = {}
+        self._by_id = {}
+
+    def _groups(self):
+        version = self.version()
+        with self._lock:
+            if version != self._version:
+                groups = list(Group.objects.order_by('title', 'id'))
+                self._by_slug = {group.slug: group for group in groups}
+                self._by_id = {group.pk: group for group in groups}
+                self._version = version
+            return self._by_slug, self._by_id
+
+    def version(self):
+        """Версия набора групп: меняется при любой правке группы."""
+        return feed_version(SCOPE)
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def all(self):
+        return list(self._groups()[1].values())
+
+    def by_slug(self, slug):
+        return self._groups()[0].get(slug)
+
+    def by_id(self, pk):
+        return self._groups()[1].get(pk) if pk else None
+
+    def choices(self, empty_label):
+        return [('', empty_label)] + [
+            (group.pk, str(group)) for group in self.all()
+        ]
+
+
+registry = GroupRegistry()
+
+
+def get_group_or_404(slug):
+    group = registry.by_slug(slug)
+    if group is None:
+        raise Http404('No Group matches the given query.')
+    return group
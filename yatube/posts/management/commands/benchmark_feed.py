@@ -0,0 +1,111 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts.counters import recount
+from posts.models import FeedEntry, Follow, Post, User
+from posts.timeline import Timeline, follow
+from posts.utils import POSTS_PER_PAGE, CursorPaginator
+
+MODES = {
+    'pull': -1,
+    'push': 10 ** 9,
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет публикацию и чтение ленты подписок для двух крайних '
+            'форм графа подписок: читатель с множеством авторов и автор '
+            'с множеством подписчиков. Данные откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=500)
+        parser.add_argument('--followers', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--threshold', type=int, default=100)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        modes = dict(MODES, hybrid=options['threshold'])
+        self.stdout.write(
+            f'{"граф":<15}{"режим":<8}{"публикация, мс":>16}'
+            f'{"1-я стр., мс":>14}{"курсор, мс":>12}'
+        )
+        with transaction.atomic():
+            wide_reader, wide_author = self.wide_graph(
+                options['authors'], options['posts'])
+            star_reader, star = self.star_graph(
+                options['followers'], options['posts'])
+            recount()
+            for name, threshold in modes.items():
+                with override_settings(FEED_PULL_THRESHOLD=threshold):
+                    self.rebuild()
+                    self.report('много авторов', name,
+                                wide_reader, wide_author)
+                    self.report('звезда', name, star_reader, star)
+            transaction.set_rollback(True)
+
+    def wide_graph(self, authors, posts):
+        reader = User.objects.create(username='bench-reader')
+        User.objects.bulk_create(
+            User(username=f'bench-author-{i}') for i in range(authors)
+        )
+        users = User.objects.filter(username__startswith='bench-author-')
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author) for author in users
+        )
+        self.fill_posts(users, posts)
+        return reader, users[0]
+
+    def star_graph(self, followers, posts):
+        star = User.objects.create(username='bench-star')
+        User.objects.bulk_create(
+            User(username=f'bench-follower-{i}') for i in range(followers)
+        )
+        users = User.objects.filter(username__startswith='bench-follower-')
+        Follow.objects.bulk_create(
+            Follow(user=user, author=star) for user in users
+        )
+        self.fill_posts([star], posts)
+        return users[0], star
+
+    def fill_posts(self, authors, posts):
+        Post.objects.bulk_create(
+            (Post(author=author, text=f'Пост {i}')
+             for author in authors for i in range(posts)),
+            batch_size=500,
+        )
+
+    def rebuild(self):
+        FeedEntry.objects.all().delete()
+        for user_id, author_id in Follow.objects.values_list(
+                'user_id', 'author_id'):
+            follow(user_id, author_id)
+
+    def measure(self, action):
+        timings = []
+        for _ in range(self.repeat):
+            start = perf_counter()
+            action()
+            timings.append((perf_counter() - start) * 1000)
+        return median(timings)
+
+    def report(self, graph, mode, reader, author):
+        publish = self.measure(
+            lambda: Post.objects.create(author=author, text='Замер')
+        )
+        first_page = self.measure(
+            lambda: list(Timeline(reader)[0:POSTS_PER_PAGE])
+        )
+        cursor_page = self.measure(
+            lambda: list(CursorPaginator(
+                Timeline(reader), POSTS_PER_PAGE).get_page(''))
+        )
+        self.stdout.write(
+            f'{graph:<15}{mode:<8}{publish:>16.2f}'
+            f'{first_page:>14.2f}{cursor_page:>12.2f}'
+        )
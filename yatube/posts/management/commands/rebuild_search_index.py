@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import get_index
+
+
+class Command(BaseCommand):
+    help = ('Заново строит поисковый индекс постов, например после '
+            'смены SEARCH_USE_FTS5.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            get_index().rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
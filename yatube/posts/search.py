@@ -0,0 +1,179 @@
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Post, SearchTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+FTS_TABLE = 'posts_post_fts'
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH]
+            for token in TOKEN_RE.findall(text.casefold())]
+
+
+class Fts5Index:
+    """Полнотекстовая таблица SQLite FTS5, rowid - id поста.
+    Результаты ранжируются по bm25."""
+
+    def add(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    @staticmethod
+    def match(terms):
+        # Слова в кавычках: синтаксис запросов FTS5 не применяется
+        # к пользовательскому вводу, все слова обязательны.
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def matching(self, terms):
+        return RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [self.match(terms)],
+        )
+
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match(terms)],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s OFFSET %s',
+                [self.match(terms), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class TermIndex:
+    """Обратный индекс в таблице SearchTerm для баз без FTS5.
+    Результаты ранжируются по tf-idf."""
+
+    def add(self, post):
+        self.remove(post.pk)
+        SearchTerm.objects.bulk_create(
+            (SearchTerm(term=term, post_id=post.pk, count=count)
+             for term, count in Counter(tokenize(post.text)).items()),
+            batch_size=500,
+        )
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def rebuild(self):
+        SearchTerm.objects.all().delete()
+        for post in Post.objects.only('text').iterator():
+            self.add(post)
+
+    @staticmethod
+    def matches(terms):
+        terms = set(terms)
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post_id'
+        ).annotate(matched=Count('term')).filter(matched=len(terms))
+
+    def matching(self, terms):
+        return self.matches(terms).values('post_id')
+
+    def count(self, terms):
+        return self.matches(terms).count()
+
+    def ranked_ids(self, terms, offset, limit):
+        found = dict(SearchTerm.objects.filter(
+            term__in=set(terms)
+        ).values_list('term').annotate(Count('post_id')))
+        if len(found) < len(set(terms)):
+            return []
+        total = Post.objects.count()
+        weights = [
+            When(term=term, then=Value(math.log(1 + total / found[term])))
+            for term in found
+        ]
+        return list(self.matches(terms).annotate(score=Sum(
+            F('count') * Case(*weights, output_field=FloatField())
+        )).order_by('-score', '-post_id').values_list(
+            'post_id', flat=True
+        )[offset:offset + limit])
+
+
+_fts_table = {}
+
+
+def get_index():
+    """FTS5, если база её поддерживает и таблица создана миграцией."""
+    if settings.SEARCH_USE_FTS5 and connection.vendor == 'sqlite':
+        if connection.alias not in _fts_table:
+            _fts_table[connection.alias] = (
+                FTS_TABLE in connection.introspection.table_names()
+            )
+        if _fts_table[connection.alias]:
+            return Fts5Index()
+    return TermIndex()
+
+
+class SearchResults:
+    """Найденные посты в порядке релевантности.
+
+    Поддерживает Paginator: count() и срезы читают из индекса
+    только нужную страницу."""
+
+    ordered = True
+
+    def __init__(self, query, index=None):
+        self.terms = tokenize(query)
+        self.index = index or get_index()
+
+    def count(self):
+        return self.index.count(self.terms) if self.terms else 0
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.terms:
+            return []
+        ids = self.index.ranked_ids(self.terms, index.start,
+                                    index.stop - index.start)
+        posts = Post.objects.select_related('author').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_queryset(queryset, query):
+    """Фильтр queryset постов по совпадению с запросом, без ранжирования."""
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    return queryset.filter(pk__in=get_index().matching(terms))
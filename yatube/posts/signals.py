@@ -0,0 +1,174 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, search, storage, timeline
+from .cache import bump_feeds, forget_missing, post_scopes
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .utils import feed_count_key
+
+
+def reset_feed_counts(post, *group_ids):
+    keys = [feed_count_key('index'), feed_count_key('author', post.author_id)]
+    keys += [feed_count_key('group', pk) for pk in group_ids if pk]
+    cache.delete_many(keys)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def forget_missing_user(sender, instance, **kwargs):
+    forget_missing(User, username=instance.username)
+
+
+@receiver(post_save, sender=Post)
+def forget_missing_post(sender, instance, created, **kwargs):
+    if created:
+        forget_missing(Post, pk=instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_fields(sender, instance, **kwargs):
+    instance._saved_group_id = instance._saved_image = None
+    if instance.pk is not None:
+        instance._saved_group_id, instance._saved_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+        reset_feed_counts(instance, instance.group_id)
+    elif instance._saved_group_id != instance.group_id:
+        counters.bump_group(instance._saved_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+        reset_feed_counts(instance, instance._saved_group_id,
+                          instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+    reset_feed_counts(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Post)
+def bump_post_feeds(sender, instance, **kwargs):
+    bump_feeds(*post_scopes(instance, instance._saved_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post_feeds(sender, instance, **kwargs):
+    bump_feeds(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Post)
+def unpin_saved_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: storage.unpin(name))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    name = instance._saved_image
+    if name and name != instance.image.name:
+        transaction.on_commit(lambda: storage.release(name))
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: storage.release(name))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.get_index().add(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_index().remove(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_feeds(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).only(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        bump_feeds(*post_scopes(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_feeds(sender, instance, **kwargs):
+    bump_feeds('index', f'group:{instance.pk}', 'groups')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_feeds(sender, instance, **kwargs):
+    bump_feeds(f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        counters.bump_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    counters.bump_user(instance.user_id, 'following_count', -1)
+
+
+# Обработчики ленты подписаны после счётчиков: timeline сверяется
+# с уже обновлённым числом подписчиков автора.
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def forget_timeline_counts(sender, instance, **kwargs):
+    timeline.forget_counts(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.unfollow(instance.user_id, instance.author_id)
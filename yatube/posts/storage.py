@@ -0,0 +1,131 @@
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from sorl import thumbnail
+from sorl.thumbnail.images import ImageFile
+
+CHUNK_SIZE = 64 * 2 ** 10
+HASHED_NAME = re.compile(r'^(?:.+/)?([0-9a-f]{2})/\1[0-9a-f]{62}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы хранятся под SHA-256 содержимого: одинаковые картинки
+    разных постов - один файл с одним набором миниатюр.
+
+    Имя posts/ab/<sha256>.jpg сохраняет каталог из upload_to.
+
+    Загрузка уже существующего файла ничего не пишет, поэтому до
+    коммита поста файл держит метка .<sha256>.jpg.pin-<pid>-<поток>:
+    release не удаляет помеченный файл, хотя пост ещё не виден в базе.
+    Метку снимает unpin после коммита; при откате транзакции она
+    остаётся, и файл не удаляется. save и release одного каталога
+    выполняются под блокировкой файла .lock."""
+
+    lock_name = '.lock'
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    @contextmanager
+    def locked(self, name):
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, self.lock_name), 'ab') as file:
+            locks.lock(file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(file)
+
+    def _pin_path(self, name, owner):
+        directory, filename = os.path.split(self.path(name))
+        return os.path.join(directory, f'.{filename}.pin-{owner}')
+
+    def _own_pin_path(self, name):
+        return self._pin_path(name, f'{os.getpid()}-{threading.get_ident()}')
+
+    def is_pinned(self, name):
+        return bool(glob.glob(glob.escape(self._pin_path(name, '')) + '*'))
+
+    def unpin(self, name):
+        try:
+            os.remove(self._own_pin_path(name))
+        except FileNotFoundError:
+            pass
+
+    def save(self, name, content, max_length=None):
+        name = self.hashed_name(name, content)
+        with self.locked(name):
+            if not self.exists(name):
+                name = super().save(name, content, max_length)
+            open(self._own_pin_path(name), 'ab').close()
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое: файл с таким именем - тот же файл,
+        # суффикс к нему не добавляется.
+        return name
+
+    def _save(self, name, content):
+        # Две одновременные загрузки одних байтов пишут каждая свой
+        # временный файл и атомарно ставят его на одно и то же место.
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name.replace('\\', '/')
+
+
+def _image_storage():
+    from .models import Post
+
+    return Post._meta.get_field('image').storage
+
+
+def release(name):
+    """Удаляет файл и его миниатюры, если на него больше не ссылается
+    ни один пост и его не держит незакоммиченная загрузка."""
+    from .models import Post
+
+    if not name or not HASHED_NAME.match(name):
+        # Файлы, сохранённые до хранилища по содержимому, не трогаем.
+        return
+    storage = _image_storage()
+    with storage.locked(name):
+        if storage.is_pinned(name):
+            return
+        if not Post.objects.filter(image=name).exists():
+            thumbnail.delete(ImageFile(name, storage))
+
+
+def unpin(name):
+    """Снимает метку загрузки текущего потока после коммита поста."""
+    if name and HASHED_NAME.match(name):
+        _image_storage().unpin(name)
@@ -0,0 +1,70 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from posts import thumbnails
+from posts.groups import registry
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/single_post.html'
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def card_key(post, show_post, groups_version):
+    # Ссылка на группу есть только в карточке с show_post:
+    # такие карточки устаревают при правке групп.
+    groups = groups_version if show_post and post.group_id else 0
+    return (f'post-card:{post.pk}:{post.updated_at.timestamp()}:'
+            f'{post.comments_count}:{int(bool(show_post))}:{groups}')
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, show_post=False):
+    """Карточка поста из кэша. При первом вызове на странице
+    все карточки page_obj запрашиваются одним get_many."""
+    page = context.render_context.get(CARD_TEMPLATE)
+    if page is None:
+        groups_version = registry.version()
+        keys = [card_key(item, show_post, groups_version)
+                for item in context.get('page_obj', ())]
+        page = context.render_context[CARD_TEMPLATE] = (
+            groups_version, cache.get_many(keys)
+        )
+    groups_version, cards = page
+    key = card_key(post, show_post, groups_version)
+    html = cards.get(key)
+    if html is None:
+        html = render_to_string(
+            CARD_TEMPLATE, {'post': post, 'show_post': show_post}
+        )
+        if not post.image or thumbnails.post_variants(post):
+            cache.set(key, html, settings.POST_CARD_TIMEOUT)
+        cards[key] = html
+    return html
+
+
+@register.filter
+def group_by_id(pk):
+    return registry.by_id(pk)
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_image(post, sizes=IMAGE_SIZES):
+    """Картинка поста с вариантами разной ширины и формата.
+    Варианты берутся из thumbnails.prefetch_variants, если он был.
+    Размеры и цвет-заглушка резервируют место до загрузки картинки."""
+    variants = thumbnails.post_variants(post)
+    if variants:
+        width, height = variants['width'], variants['height']
+    else:
+        width, height = post.image_width, post.image_height
+    return {
+        'image': post.image,
+        'variants': variants,
+        'sizes': sizes,
+        'width': width,
+        'height': height,
+        'placeholder': post.image_placeholder,
+    }
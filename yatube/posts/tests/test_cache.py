@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, override_settings
+
+from posts.cache import single_flight
+
+WORKERS = 8
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared-test',
+    },
+    'shared-test': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'posts-shared-test',
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHES, FEED_LOCK_POLL_INTERVAL=0.01)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches['shared-test'].clear()
+        self.builds = 0
+        self.lock = threading.Lock()
+
+    def build(self, value):
+        def build():
+            with self.lock:
+                self.builds += 1
+            time.sleep(0.2)
+            return value
+        return build
+
+    def run_workers(self, version, value):
+        barrier = threading.Barrier(WORKERS)
+        results = []
+
+        def worker():
+            # Свой экземпляр кэша в каждом потоке, как в отдельном процессе.
+            barrier.wait()
+            results.append(
+                single_flight('page', version, self.build(value), 60)
+            )
+
+        threads = [threading.Thread(target=worker) for _ in range(WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_parallel_misses_build_once(self):
+        """Одновременные промахи приводят к одной пересборке."""
+        results = self.run_workers(1, 'страница')
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(results, ['страница'] * WORKERS)
+
+    def test_stale_value_served_during_rebuild(self):
+        """Пока страница пересобирается, остальные получают старую."""
+        single_flight('page', 1, self.build('старая'), 60)
+        self.builds = 0
+        results = self.run_workers(2, 'новая')
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(results.count('новая'), 1)
+        self.assertEqual(results.count('старая'), WORKERS - 1)
+        self.assertEqual(single_flight('page', 2, self.build('?'), 60),
+                         'новая')
+
+    def test_early_refresh_near_expiry(self):
+        """Значение, которое вот-вот истечёт, пересобирается заранее."""
+        cache.set('page', (1, 'старая', 60, time.time()), 120)
+        self.assertEqual(single_flight('page', 1, self.build('новая'), 60),
+                         'новая')
+        self.assertEqual(self.builds, 1)
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счётчики
+        автора и группы."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии увеличивают и уменьшают счётчик поста."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики подписчиков и подписок."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        Follow.objects.filter(user=self.reader, author=self.user).delete()
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_delete_user_with_content(self):
+        """Удаление пользователя с постами, комментариями и подписками
+        не оставляет счётчиков, ссылающихся на него."""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(author=author, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(author=author, post=post, text='Свой')
+        Comment.objects.create(author=self.reader, post=post, text='Чужой')
+        Follow.objects.create(user=author, author=self.user)
+        Follow.objects.create(user=self.reader, author=author)
+        author_id = author.pk
+        author.delete()
+        connection.check_constraints()
+        self.assertFalse(UserStats.objects.filter(user_id=author_id).exists())
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount_counters восстанавливает разошедшиеся счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(3)
+        )
+        Follow.objects.bulk_create([Follow(user=self.reader,
+                                           author=self.user)])
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(self.stats(self.user).posts_count, 3)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
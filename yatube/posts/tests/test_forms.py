@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -16,8 +17,6 @@ GROUP_LIST_URL = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
 PROFILE_URL = reverse('posts:profile', kwargs={'username': 'test-user'})
 POST_CREATE_URL = reverse('posts:post_create')
 FOLDER_POSTS_IMAGE = 'posts/'
-IMAGE = 'small.gif'
-IMAGE_WAY = FOLDER_POSTS_IMAGE + IMAGE
 SMALL_GIF = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
     b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -25,6 +24,8 @@ SMALL_GIF = (
     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B')
+IMAGE_HASH = hashlib.sha256(SMALL_GIF).hexdigest()
+IMAGE_WAY = f'{FOLDER_POSTS_IMAGE}{IMAGE_HASH[:2]}/{IMAGE_HASH}.gif'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
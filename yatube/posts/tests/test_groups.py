@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.forms import PostForm
+from posts.groups import registry
+from posts.models import Group, Post, User
+
+
+class GroupRegistryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        registry.invalidate()
+
+    def test_lookups_served_from_memory(self):
+        """После загрузки реестр отвечает без запросов к базе."""
+        registry.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.by_slug('test-slug'), self.group)
+            self.assertEqual(registry.by_id(self.group.pk), self.group)
+            self.assertIsNone(registry.by_slug('missing'))
+            PostForm().as_p()
+
+    def test_group_changes_reload_registry(self):
+        """Изменение и создание группы сразу видны в реестре."""
+        registry.all()
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(registry.by_id(group.pk).title, 'Новое название')
+        Group.objects.create(title='Вторая', slug='second')
+        self.assertIsNotNone(registry.by_slug('second'))
+
+    def test_group_page_shows_current_posts_count(self):
+        """Число записей на странице группы не берётся из реестра."""
+        self.client.get(reverse('posts:group_list', args=['test-slug']))
+        author = User.objects.create_user(username='author')
+        for _ in range(2):
+            Post.objects.create(author=author, text='Пост', group=self.group)
+        response = self.client.get(
+            reverse('posts:group_list', args=['test-slug'])
+        )
+        self.assertContains(response, 'Записей в группе: 2')
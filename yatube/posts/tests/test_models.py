@@ -1,6 +1,10 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import Q
 from django.test import TestCase
 
-from posts.models import Group, Post, User, Comment
+from posts.models import Group, Post, User, Comment, FeedEntry, Follow
 
 
 class PostModelTest(TestCase):
@@ -32,3 +36,56 @@ class PostModelTest(TestCase):
         for value, expected in correct_object_names:
             with self.subTest(value=value):
                 self.assertEqual(value, expected)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Пост',
+                                       group=cls.group)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент идут по составным индексам без сортировки
+        во временном B-дереве."""
+        feed = Post.objects.order_by('-pub_date', '-id')
+        queries = {
+            'post_pub_date_id_idx': feed[:10],
+            'post_author_pub_date_idx': feed.filter(author=self.user)[:10],
+            'post_group_pub_date_idx': feed.filter(group=self.group)[:10],
+            'comment_post_created_idx': Comment.objects.filter(
+                post=self.post).order_by('created', 'id'),
+            'follow_author_user_idx': Follow.objects.filter(
+                author=self.user).values('user_id'),
+            'feedentry_user_pub_date_idx': FeedEntry.objects.filter(
+                user=self.user).order_by('-pub_date', '-post_id')[:10],
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                plan = self.query_plan(queryset)
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_cursor_page_is_index_range(self):
+        """Следующая страница курсора - диапазон по индексу ленты."""
+        feed = Post.objects.filter(
+            pub_date__lte=self.post.pub_date
+        ).filter(
+            Q(pub_date__lt=self.post.pub_date) | Q(id__lt=self.post.pk)
+        ).order_by('-pub_date', '-id')[:11]
+        plan = self.query_plan(feed)
+        self.assertIn('post_pub_date_id_idx (pub_date<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
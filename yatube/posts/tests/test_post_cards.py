@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from posts.groups import registry
+from posts.models import Follow, Group, Post, User
+from posts.templatetags.post_cards import card_key
+
+FOLLOW_URL = reverse('posts:follow_index')
+
+
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {i}') for i in range(3)
+        )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.follower)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_page_cards_fetched_with_one_get_many(self):
+        """Карточки страницы запрашиваются из кэша одним get_many."""
+        spy = mock.Mock(wraps=cache)
+        with mock.patch('posts.templatetags.post_cards.cache', spy):
+            self.client.get(FOLLOW_URL)
+        self.assertEqual(spy.get_many.call_count, 1)
+        self.assertEqual(len(spy.get_many.call_args[0][0]), 3)
+
+    def test_cached_card_is_reused(self):
+        """Повторный рендер берёт карточку из кэша."""
+        post = Post.objects.latest('id')
+        self.client.get(FOLLOW_URL)
+        key = card_key(post, True, registry.version())
+        self.assertIsNotNone(cache.get(key))
+        cache.set(key, 'Карточка из кэша')
+        self.assertContains(self.client.get(FOLLOW_URL), 'Карточка из кэша')
+
+    def test_group_change_renders_new_card(self):
+        """После смены slug группы карточка ссылается на новый адрес."""
+        group = Group.objects.create(title='Группа', slug='old-slug',
+                                     description='Описание')
+        Post.objects.filter(pk=Post.objects.latest('id').pk).update(
+            group=group
+        )
+        self.assertContains(self.client.get(FOLLOW_URL),
+                            reverse('posts:group_list', args=['old-slug']))
+        group.slug = 'new-slug'
+        group.save()
+        response = self.client.get(FOLLOW_URL)
+        self.assertContains(response,
+                            reverse('posts:group_list', args=['new-slug']))
+        self.assertNotContains(response,
+                               reverse('posts:group_list', args=['old-slug']))
+
+    def test_edit_renders_new_card(self):
+        """После редактирования поста карточка рендерится заново."""
+        post = Post.objects.latest('id')
+        self.client.get(FOLLOW_URL)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Исправленный текст'},
+        )
+        response = self.client.get(FOLLOW_URL)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertNotContains(response, post.text)
+
+
+class PostImageTests(SimpleTestCase):
+    template = Template('{% load post_cards %}{% post_image post %}')
+
+    def render(self, variants):
+        post = Post(image='posts/photo.jpg', image_width=640,
+                    image_height=480, image_placeholder='#a0b0c0')
+        with mock.patch('posts.thumbnails.post_variants',
+                        return_value=variants):
+            return self.template.render(Context({'post': post}))
+
+    def test_original_reserves_its_size(self):
+        """Без вариантов картинка выводится с исходными размерами
+        и цветом-заглушкой."""
+        html = self.render(None)
+        self.assertIn('width="640" height="480"', html)
+        self.assertIn('background-color: #a0b0c0', html)
+
+    def test_variant_reserves_its_size(self):
+        """С вариантами указываются размеры самого большого из них."""
+        html = self.render({'src': '/media/cache/a.jpg', 'width': 960,
+                            'height': 960, 'srcset': '/media/cache/a.jpg 960w',
+                            'webp_srcset': ''})
+        self.assertIn('width="960" height="960"', html)
+        self.assertIn('background-color: #a0b0c0', html)
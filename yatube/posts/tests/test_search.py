@@ -0,0 +1,110 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, SearchTerm, User
+from posts.search import Fts5Index, SearchResults, TermIndex, get_index
+from posts.utils import POSTS_PER_PAGE
+
+SEARCH_URL = reverse('posts:search')
+ADMIN_URL = reverse('admin:posts_post_changelist')
+
+
+class SearchMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.cats = Post.objects.create(
+            author=self.author, text='Кошки и коты: про кошек и котов'
+        )
+        self.dogs = Post.objects.create(
+            author=self.author, text='Собаки лучше, чем кошки'
+        )
+        self.mixed = Post.objects.create(
+            author=self.author, text='Кошки, Кошки, КОШКИ и собаки'
+        )
+
+    def search(self, query):
+        return list(SearchResults(query))
+
+    def test_index_backend(self):
+        self.assertIsInstance(get_index(), self.index_class)
+
+    def test_all_words_required(self):
+        """Находятся только посты со всеми словами запроса."""
+        self.assertEqual(self.search('собаки кошки'),
+                         [self.mixed, self.dogs])
+        self.assertEqual(self.search('коты'), [self.cats])
+        self.assertEqual(self.search('жирафы'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_ranked_by_relevance(self):
+        """Пост с большим числом вхождений слова выше."""
+        self.assertEqual(self.search('кошки')[0], self.mixed)
+
+    def test_index_follows_edit_and_delete(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        self.cats.text = 'Теперь про жирафов'
+        self.cats.save()
+        self.assertEqual(self.search('жирафов'), [self.cats])
+        self.assertNotIn(self.cats, self.search('кошки'))
+        self.cats.delete()
+        self.assertEqual(self.search('жирафов'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        """Операторы в запросе ищутся как обычные слова."""
+        self.assertEqual(self.search('кошки OR "жирафы'), [])
+        self.assertEqual(self.search('NEAR(кошки'), [])
+
+    def test_search_page_paginated(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Жираф {i}')
+            for i in range(POSTS_PER_PAGE + 3)
+        )
+        get_index().rebuild()
+        response = self.client.get(SEARCH_URL, {'q': 'жираф', 'page': 2})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, POSTS_PER_PAGE + 3)
+        self.assertEqual(len(page_obj), 3)
+        self.assertContains(response, '?q=%D0%B6%D0%B8%D1%80%D0%B0%D1%84'
+                                      '&amp;page=1')
+
+    def test_empty_query(self):
+        response = self.client.get(SEARCH_URL)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке фильтрует посты через индекс."""
+        self.client.force_login(self.admin)
+        response = self.client.get(ADMIN_URL, {'q': 'коты'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.cats])
+
+
+@override_settings(SEARCH_USE_FTS5=True)
+class Fts5SearchTests(SearchMixin, TestCase):
+    index_class = Fts5Index
+
+    def test_terms_table_not_used(self):
+        self.assertFalse(SearchTerm.objects.exists())
+
+
+@override_settings(SEARCH_USE_FTS5=False)
+class TermSearchTests(SearchMixin, TestCase):
+    index_class = TermIndex
+
+    def test_terms_counted(self):
+        self.assertEqual(
+            SearchTerm.objects.get(post=self.mixed, term='кошки').count, 3
+        )
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF[:-1] + b'\x00\x3B'
+
+
+def upload(content=SMALL_GIF, name='small.gif'):
+    return SimpleUploadedFile(name, content, 'image/gif')
+
+
+class StorageTestMixin:
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, **kwargs):
+        return Post.objects.create(author=self.user, text='Пост', **kwargs)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(StorageTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_same_bytes_share_one_file(self):
+        """Одинаковые картинки разных постов - один файл."""
+        first = self.create_post(image=upload(name='first.gif'))
+        second = self.create_post(image=upload(name='second.GIF'))
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(first.image.name,
+                         f'posts/{digest[:2]}/{digest}.gif')
+        self.assertEqual(second.image.name, first.image.name)
+
+    def test_concurrent_save_of_same_bytes(self):
+        """Загрузка, закончившая запись после проверки exists() другой,
+        сохраняется под тем же именем без суффикса."""
+        storage = Post._meta.get_field('image').storage
+        name = self.create_post(image=upload()).image.name
+        checks = []
+
+        def exists(path):
+            # Первая проверка опережает чужую запись, дальше файл есть.
+            checks.append(path)
+            return len(checks) > 1 and os.path.exists(storage.path(path))
+
+        with mock.patch.object(type(storage), 'exists', side_effect=exists):
+            self.assertEqual(storage.save('posts/small.gif', upload()), name)
+        files = os.listdir(os.path.dirname(storage.path(name)))
+        self.assertEqual([file for file in files if not file.startswith('.')],
+                         [os.path.basename(name)])
+
+    def test_different_bytes_get_different_files(self):
+        """Разные картинки хранятся под разными именами."""
+        first = self.create_post(image=upload())
+        second = self.create_post(image=upload(OTHER_GIF))
+        self.assertNotEqual(first.image.name, second.image.name)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageReleaseTests(StorageTestMixin, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+
+    def test_file_removed_with_last_reference(self):
+        """Файл удаляется вместе с последним ссылающимся постом."""
+        first = self.create_post(image=upload())
+        second = self.create_post(image=upload())
+        storage = first.image.storage
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_replaced_image_released(self):
+        """Заменённая картинка удаляется, если больше не используется."""
+        post = self.create_post(image=upload())
+        old_name = post.image.name
+        post.image = upload(OTHER_GIF)
+        post.save()
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_release_keeps_file_of_uncommitted_upload(self):
+        """Удаление последнего поста с картинкой не стирает файл,
+        который уже вернула загрузка ещё не записанного поста."""
+        first = self.create_post(image=upload())
+        storage = first.image.storage
+        name = storage.save('posts/small.gif', upload())
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        second = self.create_post(image=name)
+        self.assertFalse(storage.is_pinned(name))
+        second.delete()
+        self.assertFalse(storage.exists(name))
+
+    def test_upload_after_release_rewrites_file(self):
+        """Загрузка после удаления файла записывает его заново."""
+        first = self.create_post(image=upload())
+        storage = first.image.storage
+        first.delete()
+        self.assertFalse(storage.exists(first.image.name))
+        second = self.create_post(image=upload())
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertTrue(storage.exists(second.image.name))
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackgroundThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        cls.url = reverse('posts:post_detail',
+                          kwargs={'post_id': cls.post.pk})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_render_falls_back_to_original(self):
+        """Пока миниатюры нет, страница показывает исходную картинку,
+        а миниатюра ставится в очередь."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.client.get(self.url)
+            self.assertIsNone(thumbnails.variants(self.post.image))
+        schedule.assert_called_with(self.post.image.name)
+        self.assertContains(response, self.post.image.url)
+
+    def test_generated_thumbnail_is_used(self):
+        """После фоновой генерации шаблон берёт готовую миниатюру."""
+        thumbnails.generate(self.post.image.name)
+        self.assertIsNotNone(thumbnails.variants(self.post.image))
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.client.get(self.url)
+        schedule.assert_not_called()
+        self.assertNotContains(response, self.post.image.url)
+        for width in thumbnails.WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_worker_closes_its_connection(self):
+        """Поток пула закрывает свои соединения с базой после задачи,
+        даже если она упала."""
+        closed_in = []
+        generate = mock.Mock(side_effect=RuntimeError)
+        close_all = mock.Mock(
+            side_effect=lambda: closed_in.append(threading.get_ident())
+        )
+        with mock.patch.object(thumbnails, 'generate', generate), \
+                mock.patch.object(connections, 'close_all', close_all):
+            future = thumbnails._pool.submit(thumbnails._work, 'name')
+            with self.assertRaises(RuntimeError):
+                future.result()
+        self.assertEqual(len(closed_in), 1)
+        self.assertNotEqual(closed_in[0], threading.get_ident())
+
+    def test_page_variants_fetched_in_one_batch(self):
+        """Варианты картинок страницы читаются одним пакетом."""
+        for i in range(3):
+            Post.objects.create(
+                author=self.user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(f'{i}.gif', SMALL_GIF + bytes([i]),
+                                         'image/gif'),
+            )
+        store = default.kvstore
+        with mock.patch.object(store, 'get_many',
+                               wraps=store.get_many) as get_many, \
+                mock.patch.object(store, '_get_raw') as get_raw, \
+                mock.patch.object(thumbnails, 'schedule'):
+            self.client.get(reverse('posts:index'))
+        get_many.assert_called_once()
+        self.assertEqual(len(get_many.call_args[0][0]),
+                         4 * len(thumbnails.SIZES))
+        get_raw.assert_not_called()
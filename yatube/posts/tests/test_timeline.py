@@ -0,0 +1,104 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import FeedEntry, Follow, Post, User
+from posts.timeline import Timeline
+from posts.utils import CursorPaginator, encode_cursor
+
+FOLLOW_URL = reverse('posts:follow_index')
+
+
+@override_settings(FEED_PULL_THRESHOLD=1)
+class HybridTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.other_reader, author=cls.star)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.star if i % 2 else cls.author,
+                text=f'Пост {i}',
+            )
+            for i in range(7)
+        ]
+
+    def test_popular_author_is_not_pushed(self):
+        """Посты автора выше порога подписчиков не раскладываются
+        по лентам, посты обычного автора - раскладываются."""
+        self.assertFalse(FeedEntry.objects.filter(author=self.star).exists())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 4
+        )
+
+    def test_timeline_merges_pushed_and_pulled(self):
+        """Лента сливает оба источника по убыванию даты публикации."""
+        timeline = Timeline(self.reader)
+        self.assertEqual(timeline.count(), 7)
+        self.assertEqual(list(timeline[0:7]), self.posts[::-1])
+        self.assertEqual(list(timeline[2:4]), self.posts[::-1][2:4])
+
+    def test_timeline_cursor_pages(self):
+        """Курсорная пагинация по слитой ленте без пропусков и повторов."""
+        paginator = CursorPaginator(Timeline(self.reader), 3)
+        first = paginator.get_page('')
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual(
+            list(first) + list(second) + list(third), self.posts[::-1]
+        )
+        self.assertFalse(third.has_next())
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_author_falls_below_threshold(self):
+        """Когда автор опускается ниже порога, его посты
+        раскладываются по лентам оставшихся подписчиков."""
+        Follow.objects.filter(user=self.other_reader,
+                              author=self.star).delete()
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader,
+                                     author=self.star).count(), 3
+        )
+        self.assertEqual(list(Timeline(self.reader)[0:7]),
+                         self.posts[::-1])
+
+    def test_pushed_only_page_sliced_in_sql(self):
+        """Без популярных авторов страница читается срезом в SQL."""
+        Follow.objects.filter(author=self.star).delete()
+        timeline = Timeline(self.reader)
+        with CaptureQueriesContext(connection) as queries:
+            page = timeline[1:3]
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 2 OFFSET 1', queries[0]['sql'])
+        self.assertEqual(page, [self.posts[4], self.posts[2]])
+
+    @override_settings(FEED_MERGE_DEPTH=5)
+    def test_merged_depth_is_capped(self):
+        """Слитая лента отдаёт пагинатору не больше FEED_MERGE_DEPTH."""
+        self.assertEqual(Timeline(self.reader).count(), 5)
+
+    @override_settings(FEED_MERGE_DEPTH=5)
+    def test_capped_feed_links_to_cursor_mode(self):
+        """Последняя страница обрезанной ленты ведёт дальше по курсору."""
+        self.client.force_login(self.reader)
+        response = self.client.get(FOLLOW_URL)
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[:1:-1])
+        cursor = encode_cursor((self.posts[2].pub_date, self.posts[2].pk))
+        self.assertContains(response, f'?cursor={cursor}')
+        response = self.client.get(FOLLOW_URL, {'cursor': cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[1::-1])
+
+    def test_uncapped_feed_has_no_cursor_link(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(FOLLOW_URL)
+        self.assertNotContains(response, '?cursor=')
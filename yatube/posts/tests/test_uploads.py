@@ -0,0 +1,172 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (Client, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.models import Post, User
+from posts.uploads import EXIF_ORIENTATION
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Пиковый прирост памяти при обработке картинки в отдельном процессе.
+MEMORY_SCRIPT = '''
+import os, resource, sys
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+django.setup()
+from django.core.files import File
+from posts.uploads import process_image
+upload = File(open(sys.argv[1], 'rb'), name='big.jpg')
+upload.content_type = 'image/jpeg'
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+processed = process_image(upload)
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(after - before)
+'''
+
+
+def make_upload(size, orientation=None, mode='RGB'):
+    image = Image.new(mode, size, 128)
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    content = BytesIO()
+    image.save(content, format='JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', content.getvalue(), 'image/jpeg')
+
+
+def clean(upload):
+    form = PostForm(data={'text': 'Текст'}, files={'image': upload})
+    form.is_valid()
+    return form
+
+
+class ImageUploadTests(SimpleTestCase):
+    databases = {'default'}
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_oversized_image_downsized(self):
+        """Слишком большая картинка уменьшается до POST_IMAGE_MAX_SIDE."""
+        form = clean(make_upload((400, 200)))
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_exif_orientation_applied(self):
+        """Картинка поворачивается по EXIF-ориентации."""
+        form = clean(make_upload((40, 20), orientation=6))
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(image.getexif().get(EXIF_ORIENTATION, 1), 1)
+
+    def test_small_image_kept_as_is(self):
+        """Картинка в пределах лимитов не перекодируется."""
+        upload = make_upload((40, 20))
+        form = clean(upload)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_dimensions_and_placeholder_recorded(self):
+        """Размеры итоговой картинки и её цвет сохраняются в посте."""
+        form = clean(make_upload((400, 200), orientation=6))
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.instance
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertEqual(post.image_placeholder, '#800000')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку."""
+        form = clean(make_upload((100, 100)))
+        self.assertTrue(form.has_error('image', 'too_many_pixels'))
+
+    def test_large_jpeg_decoded_in_bounded_memory(self):
+        """Обработка большого JPEG занимает меньше памяти,
+        чем одно его декодирование в полном размере."""
+        size = (6000, 6000)
+        full_decode_kb = size[0] * size[1] // 1024
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as big:
+            Image.new('L', size, 128).save(big, format='JPEG')
+            big.flush()
+            result = subprocess.run(
+                [sys.executable, '-c', MEMORY_SCRIPT, big.name],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE':
+                     'yatube.settings'},
+            )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertLess(int(result.stdout), full_decode_kb)
+
+
+class ImageUploadViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader')
+        self.client.force_login(self.user)
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_large_file_rejected(self):
+        """Файл больше POST_IMAGE_MAX_UPLOAD_SIZE, обрезанный при
+        загрузке, отклоняется с сообщением о размере."""
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'Текст', 'image': make_upload((100, 100)),
+        })
+        self.assertTrue(
+            response.context['form'].has_error('image', 'file_too_large')
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_csrf_checked_after_handler_swap(self):
+        """Смена обработчиков загрузки не отключает проверку CSRF."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('posts:post_create'),
+                               {'text': 'Текст'})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class AdminImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(self.admin)
+
+    def add_post(self, upload):
+        return self.client.post(reverse('admin:posts_post_add'), {
+            'text': 'Текст', 'author': self.admin.pk, 'image': upload,
+        })
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_large_file_rejected_by_size(self):
+        """Админка отклоняет большой файл по размеру, а не как
+        испорченную картинку."""
+        response = self.add_post(make_upload((100, 100)))
+        form = response.context['adminform'].form
+        self.assertTrue(form.has_error('image', 'file_too_large'))
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_image_processed_like_on_site(self):
+        """Картинка из админки уменьшается и описывается в посте."""
+        response = self.add_post(make_upload((400, 200)))
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        self.assertEqual(post.image_placeholder, '#800000')
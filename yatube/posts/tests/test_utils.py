@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.test import TestCase, override_settings
+
+from posts.models import Group, Post, User
+from posts.utils import (CachedCountPaginator, estimate_count,
+                         feed_count_key, page_window)
+
+INDEX_KEY = feed_count_key('index')
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}',
+                 group=cls.group if i % 2 else None)
+            for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_served_from_cache(self):
+        """Повторный подсчёт ленты не обращается к базе."""
+        self.assertEqual(
+            CachedCountPaginator(Post.objects.all(), 10, INDEX_KEY).count, 5
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(
+                Post.objects.all(), 10, INDEX_KEY
+            ).count, 5)
+
+    def test_new_post_resets_feed_counts(self):
+        """Публикация сбрасывает счётчики общей ленты, ленты автора
+        и ленты группы."""
+        keys = [INDEX_KEY, feed_count_key('author', self.user.pk),
+                feed_count_key('group', self.group.pk)]
+        cache.set_many(dict.fromkeys(keys, 5))
+        Post.objects.create(author=self.user, text='Новый пост',
+                            group=self.group)
+        self.assertEqual(cache.get_many(keys), {})
+
+    @override_settings(FEED_COUNT_ESTIMATE_THRESHOLD=2)
+    def test_large_feed_count_is_estimated(self):
+        """Выше порога лента без фильтров считается по границам ключа,
+        отфильтрованная - точно."""
+        Post.objects.filter(pk=Post.objects.order_by('pk')[1].pk).delete()
+        self.assertEqual(estimate_count(Post.objects.all()), 5)
+        self.assertEqual(
+            estimate_count(Post.objects.filter(author=self.user)), 4
+        )
+        self.assertEqual(estimate_count(Post.objects.filter(group=None)), 3)
+
+
+class PageWindowTests(TestCase):
+    def test_window_around_current_page(self):
+        """Окно навигации: первая и последняя страницы, соседи текущей
+        и многоточия вместо пропусков."""
+        paginator = Paginator(range(500000), 10)
+        cases = {
+            1: [1, 2, 3, None, 50000],
+            4: [1, 2, 3, 4, 5, 6, None, 50000],
+            25000: [1, None, 24998, 24999, 25000, 25001, 25002,
+                    None, 50000],
+            50000: [1, None, 49998, 49999, 50000],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    page_window(paginator.page(number)), expected
+                )
+
+    def test_single_page(self):
+        self.assertEqual(page_window(Paginator([], 10).page(1)), [1])
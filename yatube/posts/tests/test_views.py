@@ -7,10 +7,14 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.test import (TestCase, Client, RequestFactory,
+                         override_settings)
 from django.urls import reverse
 
-from posts.models import Group, Post, Follow, User
+from posts.cache import missing_cache, missing_key
+from posts.models import Comment, FeedEntry, Group, Post, Follow, User
+from posts.utils import (COMMENTS_CURSOR_PARAM, COMMENTS_PER_PAGE,
+                         feed_count_key, get_paginator)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -183,18 +187,39 @@ class PostViewsTests(TestCase):
                 self.assertNotIn(expected, form_field)
 
     def test_clean_cache_index(self):
-        """Записи в Index хранятся в кэше и обновляются раз в 20 секунд"""
+        """Index отдаётся из кэша, пока лента не изменилась,
+        и обновляется сразу после новой записи."""
         request_1 = self.authorized_client.get(INDEX_URL)
+        request_2 = self.authorized_client.get(INDEX_URL)
+        self.assertIsNone(request_2.context)
+        self.assertEqual(request_1.content, request_2.content)
         Post.objects.create(
-            text='Тестовый текст',
+            text='Свежий текст',
             author=self.user,
             group=self.group,
         )
-        request_2 = self.authorized_client.get(INDEX_URL)
-        self.assertEqual(request_1.content, request_2.content)
-        cache.clear()
         request_3 = self.authorized_client.get(INDEX_URL)
-        self.assertNotEqual(request_2.content, request_3.content)
+        self.assertContains(request_3, 'Свежий текст')
+
+    def test_feed_fragments_follow_writes(self):
+        """Закэшированные ленты группы и профиля обновляются
+        после новой записи и нового комментария."""
+        for url in (GROUP_LIST_URL, PROFILE_URL):
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            text='Свежий текст',
+            author=self.user,
+            group=self.group,
+        )
+        for url in (GROUP_LIST_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Свежий текст')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        for url in (INDEX_URL, GROUP_LIST_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Комментариев: 1')
 
 
 class PaginatorViewsTest(TestCase):
@@ -202,6 +227,7 @@ class PaginatorViewsTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.user = User.objects.create_user(username='test-user')
+        cls.follower = User.objects.create_user(username='follower')
         cls.group = Group.objects.create(
             title="Тестовая группа",
             slug='test-slug',
@@ -237,6 +263,69 @@ class PaginatorViewsTest(TestCase):
                         len(response.context.get('page_obj').object_list),
                         count)
 
+    def test_paginator_renders_page_window(self):
+        """На длинной ленте выводится окно страниц, а не все номера."""
+        Post.objects.create(author=self.user, text='Пост')
+        cache.set(feed_count_key('index'), 500000)
+        response = self.guest_client.get(INDEX_URL, {'page': 2})
+        self.assertContains(response, '?page=50000')
+        self.assertContains(response, '?page=4"')
+        self.assertNotContains(response, '?page=5"')
+        self.assertNotContains(response, '?page=49999')
+
+    def test_cursor_paginator_walks_feed(self):
+        """Курсорная пагинация проходит ленту вперёд и назад
+        без пропусков и повторов, каждая страница - один запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(POSTS_ON_THE_PAGE + POSTS_ON_THE_SECOND_PAGE)
+        )
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        factory = RequestFactory()
+        with self.assertNumQueries(1):
+            first = get_paginator(
+                Post.objects.all(), factory.get(INDEX_URL, {'cursor': ''})
+            )
+            self.assertEqual(list(first), expected[:POSTS_ON_THE_PAGE])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+        with self.assertNumQueries(1):
+            second = get_paginator(
+                Post.objects.all(),
+                factory.get(INDEX_URL, {'cursor': first.next_cursor})
+            )
+            self.assertEqual(list(second), expected[POSTS_ON_THE_PAGE:])
+        self.assertFalse(second.has_next())
+        back = get_paginator(
+            Post.objects.all(),
+            factory.get(INDEX_URL, {'cursor': second.previous_cursor})
+        )
+        self.assertEqual(list(back), expected[:POSTS_ON_THE_PAGE])
+
+    def test_cursor_paginator_in_views(self):
+        """Все ленты поддерживают параметр ?cursor=."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(POSTS_ON_THE_PAGE + POSTS_ON_THE_SECOND_PAGE)
+        )
+        Follow.objects.create(user=self.follower, author=self.user)
+        self.authorized_client.force_login(self.follower)
+        for url in (INDEX_URL, GROUP_LIST_URL, PROFILE_URL, FOLLOW_URL):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url, {'cursor': ''})
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), POSTS_ON_THE_PAGE)
+                response = self.authorized_client.get(
+                    url, {'cursor': page_obj.next_cursor}
+                )
+                self.assertEqual(len(response.context['page_obj']),
+                                 POSTS_ON_THE_SECOND_PAGE)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор открывает первую страницу ленты."""
+        response = self.guest_client.get(INDEX_URL, {'cursor': '!!!'})
+        self.assertFalse(response.context['page_obj'].has_previous())
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -306,3 +395,247 @@ class FollowTests(TestCase):
         """Проверка, что нельзя подписаться на самого себя"""
         response = self.auth_client_following.get(self.profile_follow_url)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_new_post_pushed_to_follower_timeline(self):
+        """Новый пост автора сразу попадает в ленту подписчика."""
+        Follow.objects.create(
+            user=FollowTests.user_follower,
+            author=FollowTests.user_following
+        )
+        self.auth_client_following.post(
+            POST_CREATE_URL, data={'text': 'Свежий пост'}
+        )
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user_follower, post__text='Свежий пост'
+        ).exists())
+        response = self.auth_client_follower.get(FOLLOW_URL)
+        self.assertEqual(response.context['page_obj'][0].text,
+                         'Свежий пост')
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки записи автора удаляются из ленты подписчика."""
+        self.auth_client_follower.get(self.profile_follow_url)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user_follower).count(), 1
+        )
+        self.auth_client_follower.get(self.profile_unfollow_url)
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.user_follower).exists()
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.urls = (
+            INDEX_URL,
+            GROUP_LIST_URL,
+            PROFILE_URL,
+            FOLLOW_URL,
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменённая страница отвечает 304 без рендера шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                # Первый ответ может выставить CSRF-куку и сменить ETag.
+                self.client.get(url)
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                response = self.revalidate(url, response)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertIsNone(response.context)
+
+    def test_comment_changes_validators(self):
+        """Новый комментарий меняет ETag страниц поста."""
+        responses = {url: self.client.get(url) for url in self.urls}
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                fresh = self.revalidate(url, response)
+                self.assertEqual(fresh.status_code, HTTPStatus.OK)
+                self.assertContains(fresh, 'Комментари')
+
+    def test_guest_gets_last_modified(self):
+        """Гость получает Last-Modified и 304 по If-Modified-Since."""
+        self.client.logout()
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client.get(INDEX_URL)
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(
+            INDEX_URL, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_session_gets_fresh_page(self):
+        """После повторного входа или смены CSRF-куки страница
+        рендерится заново, а не отдаётся из кэша браузера."""
+        url = self.urls[-1]
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'rotated-token'
+        self.assertEqual(self.revalidate(url, response).status_code,
+                         HTTPStatus.OK)
+        response = self.client.get(url)
+        self.client.logout()
+        self.client.force_login(self.reader)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'rotated-token'
+        self.assertEqual(self.revalidate(url, response).status_code,
+                         HTTPStatus.OK)
+
+    def test_follow_changes_follow_feed(self):
+        """Подписка на автора меняет ETag ленты подписок."""
+        response = self.client.get(FOLLOW_URL)
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.reader, author=author)
+        fresh = self.revalidate(FOLLOW_URL, response)
+        self.assertEqual(fresh.status_code, HTTPStatus.OK)
+
+    def test_missing_objects_still_not_found(self):
+        """Для несуществующих объектов валидаторы не считаются."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+            HTTP_IF_NONE_MATCH='*',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class MissingLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        missing_cache().clear()
+
+    def test_misses_kept_out_of_default_cache(self):
+        """Промахи пишутся в отдельный кэш, а не в общий."""
+        self.client.get(reverse('posts:profile',
+                                kwargs={'username': 'nobody'}))
+        key = missing_key(User, username='nobody')
+        self.assertTrue(missing_cache().get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_repeated_misses_skip_database(self):
+        """Повторный запрос несуществующего объекта не обращается к базе."""
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'nobody'}),
+            reverse('posts:group_list', kwargs={'slug': 'nothing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 404}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code,
+                                 HTTPStatus.NOT_FOUND)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_created_objects_are_found(self):
+        """Созданный объект сразу доступен по адресу прошлого промаха."""
+        self.client.get(PROFILE_URL)
+        self.client.get(GROUP_LIST_URL)
+        user = User.objects.create_user(username='test-user')
+        Group.objects.create(title='Группа', slug='test-slug')
+        post_url = reverse('posts:post_detail', kwargs={'post_id': 404})
+        self.client.get(post_url)
+        Post.objects.create(pk=404, author=user, text='Пост')
+        for url in (PROFILE_URL, GROUP_LIST_URL, post_url):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code,
+                                 HTTPStatus.OK)
+
+
+class CommentsPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.url = reverse('posts:post_detail',
+                          kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        for i in range(count):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'Комментарий {i}')
+
+    def test_comments_load_in_one_query(self):
+        """Число запросов страницы поста не зависит от числа комментариев."""
+        self.add_comments(3)
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['comments']),
+                         COMMENTS_PER_PAGE)
+
+    def test_comments_cursor_pages(self):
+        """Последние комментарии на первой странице, ранние - по курсору."""
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual(comments[0].text,
+                         f'Комментарий {COMMENTS_PER_PAGE + 4}')
+        self.assertEqual(comments[len(comments) - 1].text, 'Комментарий 5')
+        response = self.client.get(self.url, {
+            COMMENTS_CURSOR_PARAM: comments.next_cursor,
+        })
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']][::-1],
+            [f'Комментарий {i}' for i in range(5)],
+        )
+
+    def test_comments_fragment(self):
+        """Фрагмент отдаёт только комментарии после курсора."""
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        cursor = self.client.get(self.url).context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {COMMENTS_CURSOR_PARAM: cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'Комментарий 0')
+        self.assertNotContains(response, 'Комментарий 5\n')
+
+    def test_ajax_comment_returns_fragment(self):
+        """AJAX-комментарий возвращает фрагмент нового комментария."""
+        self.client.force_login(self.user)
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        response = self.client.post(url, {'text': 'Новый комментарий'},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertTemplateUsed(response, 'includes/comment_item.html')
+        self.assertContains(response, 'Новый комментарий',
+                            status_code=HTTPStatus.CREATED)
+        response = self.client.post(url, {'text': ''},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('text', response.json()['errors'])
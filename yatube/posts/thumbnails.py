@@ -0,0 +1,206 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .cache import bump_feeds, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины и форматы вариантов картинки поста для srcset. WebP
+# создаётся, только если Pillow собран с его поддержкой.
+WIDTHS = (480, 960)
+FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+SIZES = tuple(
+    (f'{width}x{width}', {'crop': 'center', 'upscale': True,
+                          'format': image_format})
+    for image_format in FORMATS
+    for width in WIDTHS
+)
+
+_pool = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS,
+                           thread_name_prefix='thumbnails')
+_pending = set()
+_lock = threading.Lock()
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который не создаёт миниатюру во время
+    рендера: пока её нет, шаблону отдаётся исходная картинка, а
+    миниатюра ставится в очередь фоновых потоков."""
+
+    def _options(self, source, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail:
+        # от них зависит имя файла миниатюры.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры без обращения к хранилищу ключей."""
+        source = ImageFile(file_)
+        options = self._options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.THUMBNAIL_IN_BACKGROUND or not file_:
+            return self.generate(file_, geometry_string, **options)
+        ready = self.ready_thumbnail(file_, geometry_string, **options)
+        if ready is not None:
+            return ready
+        schedule(file_)
+        return ImageFile(file_)
+
+
+class BatchKVStore(KVStore):
+    """Хранилище ключей sorl-thumbnail с чтением пачкой: один
+    get_many из кэша и один запрос к базе на все промахи."""
+
+    def get_many(self, image_files):
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(fetched,
+                                sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in values.items()
+            if value and value != EMPTY_VALUE
+        }
+
+
+def variants_many(images):
+    """srcset готовых вариантов по именам картинок; None для картинок,
+    варианты которых ещё не созданы (они ставятся в очередь)."""
+    wanted = {
+        image.name: [
+            (options['format'],
+             default.backend.thumbnail_file(image, geometry, **options))
+            for geometry, options in SIZES
+        ]
+        for image in images if image
+    }
+    found = default.kvstore.get_many(
+        [thumbnail for files in wanted.values() for _, thumbnail in files]
+    )
+    result = {}
+    for name, files in wanted.items():
+        ready = [(image_format, found.get(thumbnail.key))
+                 for image_format, thumbnail in files]
+        if not all(thumbnail for _, thumbnail in ready):
+            schedule(name)
+            result[name] = None
+            continue
+        srcsets = {}
+        for image_format, thumbnail in ready:
+            srcsets.setdefault(image_format, []).append(
+                f'{thumbnail.url} {thumbnail.width}w'
+            )
+        largest = ready[-1][1]
+        result[name] = {
+            'src': largest.url,
+            'width': largest.width,
+            'height': largest.height,
+            'srcset': ', '.join(srcsets['JPEG']),
+            'webp_srcset': ', '.join(srcsets.get('WEBP', ())),
+        }
+    return result
+
+
+def variants(image):
+    return variants_many([image]).get(image.name)
+
+
+def prefetch_variants(posts):
+    """Загружает варианты картинок всех постов страницы одним пакетным
+    чтением и кладёт их в post.image_variants."""
+    posts = list(posts)
+    found = variants_many([post.image for post in posts])
+    for post in posts:
+        post.image_variants = found.get(post.image.name)
+
+
+def post_variants(post):
+    if not hasattr(post, 'image_variants'):
+        post.image_variants = variants(post.image) if post.image else None
+    return post.image_variants
+
+
+def generate(name):
+    """Создаёт все миниатюры картинки и обновляет версии лент,
+    закэшированных с исходной картинкой."""
+    try:
+        source = ImageFile(name, Post._meta.get_field('image').storage)
+        for geometry, options in SIZES:
+            default.backend.generate(source, geometry, **options)
+        for post in Post.objects.filter(image=name).only(
+            'author_id', 'group_id'
+        ):
+            bump_feeds(*post_scopes(post))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def _work(name):
+    # Потоки пула живут долго, а соединения с базой открываются
+    # в каждом из них: закрываем их после каждой задачи.
+    try:
+        generate(name)
+    finally:
+        connections.close_all()
+
+
+def schedule(image):
+    """Ставит создание всех миниатюр картинки в фоновую очередь."""
+    name = getattr(image, 'name', image)
+    if not name:
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _pool.submit(_work, name)
+
+
+def schedule_on_commit(image):
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: schedule(name))
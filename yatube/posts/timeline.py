@@ -0,0 +1,175 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import FeedEntry, Follow, Post, UserStats
+from .utils import feed_count_key, keyset
+
+
+def is_pulled(author_id):
+    """Посты авторов с большим числом подписчиков не раскладываются
+    по лентам, а подтягиваются при чтении."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_PULL_THRESHOLD,
+    ).exists()
+
+
+def pulled_authors(user):
+    return list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_PULL_THRESHOLD,
+    ).values_list('author_id', flat=True))
+
+
+def follower_ids(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = follower_ids(post.author_id)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post,
+                   author_id=post.author_id, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=500,
+    )
+    cache.delete_many(
+        [feed_count_key('follow', user_id) for user_id in followers]
+    )
+
+
+def forget_counts(author_id):
+    """Сбрасывает закэшированный размер лент подписчиков автора."""
+    if not is_pulled(author_id):
+        cache.delete_many([
+            feed_count_key('follow', user_id)
+            for user_id in follower_ids(author_id)
+        ])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(author_id=author_id).exclude(
+        feed_entries__user_id=user_id
+    ).values_list('id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=post_id,
+                   author_id=author_id, pub_date=pub_date)
+         for post_id, pub_date in posts),
+        batch_size=500,
+    )
+
+
+def follow(user_id, author_id):
+    if not is_pulled(author_id):
+        backfill(user_id, author_id)
+    cache.delete(feed_count_key('follow', user_id))
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    cache.delete(feed_count_key('follow', user_id))
+    if UserStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_PULL_THRESHOLD,
+    ).exists():
+        # Автор только что перестал быть «тянущимся»:
+        # его посты снова раскладываются по лентам.
+        for follower_id in follower_ids(author_id):
+            backfill(follower_id, author_id)
+            cache.delete(feed_count_key('follow', follower_id))
+
+
+class Timeline:
+    """Лента подписок: записи, разложенные при публикации,
+    сливаются с постами популярных авторов, прочитанными на лету.
+
+    Поддерживает Paginator (count() и срезы) и CursorPaginator (keyset()).
+    Глубина слитой ленты для Paginator ограничена FEED_MERGE_DEPTH;
+    truncated после count() показывает, что лента обрезана."""
+
+    ordered = True
+
+    def __init__(self, user):
+        self.user = user
+        self.truncated = False
+        self.pulled = authors = pulled_authors(user)
+        self.sources = [(
+            FeedEntry.objects.filter(user=user).exclude(
+                author_id__in=authors
+            ).select_related('post__author'),
+            ('pub_date', 'post_id'),
+        )]
+        if authors:
+            self.sources.append((
+                Post.objects.filter(
+                    author_id__in=authors
+                ).select_related('author'),
+                ('pub_date', 'id'),
+            ))
+
+    def count(self):
+        """Размер разложенной части берётся из кэша, размер подтянутой -
+        из счётчиков публикаций популярных авторов."""
+        key = feed_count_key('follow', self.user.pk)
+        pushed = cache.get(key)
+        if pushed is None:
+            pushed = self.sources[0][0].count()
+            cache.set(key, pushed, settings.FEED_COUNT_TIMEOUT)
+        if not self.pulled:
+            return pushed
+        pulled = UserStats.objects.filter(
+            user_id__in=self.pulled
+        ).aggregate(total=Sum('posts_count'))['total'] or 0
+        self.truncated = pushed + pulled > settings.FEED_MERGE_DEPTH
+        return min(pushed + pulled, settings.FEED_MERGE_DEPTH)
+
+    def __len__(self):
+        return self.count()
+
+    def keyset(self, position, backwards, limit):
+        """k-путевое слияние источников по (pub_date, id) поста."""
+        streams = [
+            keyset(rows, fields, position, backwards, limit)
+            for rows, fields in self.sources
+        ]
+        merged = heapq.merge(
+            *[[self._as_post(row) for row in stream] for stream in streams],
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not backwards,
+        )
+        return list(islice(merged, limit))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.pulled:
+            rows, (date_field, key_field) = self.sources[0]
+            return [self._as_post(row) for row in rows.order_by(
+                f'-{date_field}', f'-{key_field}'
+            )[start:stop]]
+        # Сливаются только ключи (pub_date, id) первых stop строк
+        # каждого источника; объекты загружаются для одной страницы.
+        keys = heapq.merge(
+            *[rows.order_by(f'-{date_field}', f'-{key_field}').values_list(
+                date_field, key_field
+            )[:stop] for rows, (date_field, key_field) in self.sources],
+            reverse=True,
+        )
+        ids = [pk for _, pk in islice(keys, start, stop)]
+        posts = Post.objects.select_related('author').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    @staticmethod
+    def _as_post(row):
+        return row.post if isinstance(row, FeedEntry) else row
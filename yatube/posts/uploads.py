@@ -0,0 +1,98 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+# Форматы, которые Pillow читает, но пишет под другим именем.
+SAVE_FORMATS = {'MPO': 'JPEG'}
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск по частям и перестаёт писать после
+    POST_IMAGE_MAX_UPLOAD_SIZE байт; размер файла при этом остаётся
+    полным. Обрезанный файл не картинка, поэтому PostForm убирает его
+    до проверки поля и отклоняет по размеру."""
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) <= settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.file.write(raw_data)
+
+
+def bounded_uploads(view):
+    """Загрузки в view принимает BoundedUploadHandler.
+
+    Обработчики нельзя сменить после чтения request.POST, а его читает
+    CsrfViewMiddleware, поэтому CSRF проверяется уже после замены."""
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [BoundedUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def is_too_large(upload):
+    return upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE
+
+
+def validate_upload_size(upload):
+    if is_too_large(upload):
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_UPLOAD_SIZE // 2 ** 20},
+        )
+
+
+def process_image(upload):
+    """Проверяет загруженную картинку по заголовку и, если нужно,
+    поворачивает её по EXIF и уменьшает до POST_IMAGE_MAX_SIDE."""
+    validate_upload_size(upload)
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)s мегапикселей.',
+                code='too_many_pixels',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        limit = settings.POST_IMAGE_MAX_SIDE
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        if (getattr(image, 'n_frames', 1) > 1
+                or orientation == 1 and max(width, height) <= limit):
+            upload.seek(0)
+            return upload
+        image_format = SAVE_FORMATS.get(image.format, image.format)
+        # JPEG сразу декодируется в уменьшенном масштабе.
+        image.draft(image.mode, (limit, limit))
+        if orientation != 1:
+            image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit))
+        processed = TemporaryUploadedFile(
+            upload.name, upload.content_type, 0, None
+        )
+        image.save(processed, format=image_format, quality=90)
+    processed.size = processed.tell()
+    processed.seek(0)
+    return processed
+
+
+def describe_image(upload):
+    """Размеры картинки и её средний цвет для заглушки до загрузки."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        image.draft('RGB', (64, 64))
+        color = image.convert('RGB').resize((1, 1), Image.BOX).getpixel(
+            (0, 0)
+        )
+    upload.seek(0)
+    return width, height, '#{:02x}{:02x}{:02x}'.format(*color)
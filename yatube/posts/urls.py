@@ -6,6 +6,7 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('create/', views.post_create, name='post_create'),
@@ -13,6 +14,9 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'
          ),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'
+         ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
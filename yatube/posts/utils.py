@@ -1,10 +1,233 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 POSTS_PER_PAGE = 10
+PAGE_WINDOW = 2
+CURSOR_PARAM = 'cursor'
+CURSOR_FIELDS = ('pub_date', 'id')
+COMMENTS_PER_PAGE = 50
+COMMENTS_CURSOR_PARAM = 'comments'
+COMMENT_CURSOR_FIELDS = ('created', 'id')
+
+
+def feed_count_key(feed, pk=None):
+    return f'feed-count:{feed}' if pk is None else f'feed-count:{feed}:{pk}'
+
+
+def estimate_count(posts):
+    """Точное число записей, если их не больше порога, иначе
+    для ленты без фильтров - оценка по границам первичного ключа."""
+    limit = settings.FEED_COUNT_ESTIMATE_THRESHOLD
+    posts = posts.order_by()
+    count = posts[:limit + 1].count()
+    if count <= limit:
+        return count
+    if not posts.query.where:
+        bounds = posts.aggregate(low=Min('pk'), high=Max('pk'))
+        return bounds['high'] - bounds['low'] + 1
+    return posts.count()
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт общее число записей ленты из кэша.
+    Ключ сбрасывается сигналами при публикации и удалении постов."""
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.count_key)
+        if count is None:
+            count = estimate_count(self.object_list)
+            cache.set(self.count_key, count, settings.FEED_COUNT_TIMEOUT)
+        return count
+
+
+def encode_cursor(position, backwards=False):
+    pub_date, pk = position
+    raw = f'{"p" if backwards else "n"}|{pub_date.isoformat()}|{pk}'
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для битого токена возвращает None."""
+    try:
+        direction, pub_date, pk = (
+            urlsafe_b64decode(token.encode()).decode().split('|')
+        )
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if pub_date is None or direction not in ('n', 'p'):
+        return None
+    return pub_date, pk, direction == 'p'
+
+
+class CursorPage:
+    """Страница ленты, полученная одним диапазонным запросом
+    по (pub_date, id) без COUNT(*) и OFFSET."""
+
+    is_cursor = True
+    number = None
+
+    def __init__(self, object_list, cursor, first, last,
+                 has_next, has_previous):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.first = first
+        self.last = last
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor!r}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or self.last is None:
+            return None
+        return encode_cursor(self.last)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or self.first is None:
+            return None
+        return encode_cursor(self.first, backwards=True)
+
+
+def keyset(rows, fields, position=None, backwards=False, limit=None):
+    """Строки после позиции (pub_date, pk) в порядке убывания,
+    а при backwards - строки до позиции в порядке возрастания."""
+    date_field, key_field = fields
+    if position is None:
+        rows = rows.order_by(f'-{date_field}', f'-{key_field}')
+    else:
+        pub_date, pk = position
+        op = 'gt' if backwards else 'lt'
+        # Условие по одной дате даёт диапазон по индексу,
+        # второе отсекает уже показанные строки с той же датой.
+        rows = rows.filter(
+            **{f'{date_field}__{op}e': pub_date}
+        ).filter(
+            Q(**{f'{date_field}__{op}': pub_date})
+            | Q(**{f'{key_field}__{op}': pk})
+        )
+        if backwards:
+            rows = rows.order_by(date_field, key_field)
+        else:
+            rows = rows.order_by(f'-{date_field}', f'-{key_field}')
+    return list(rows[:limit])
+
+
+class CursorPaginator:
+    """Keyset-пагинация по убыванию пары полей (дата, первичный ключ).
+    object_list - QuerySet или объект с собственным методом keyset()."""
+
+    def __init__(self, object_list, per_page, fields=CURSOR_FIELDS):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.fields = fields
+
+    def _keyset(self, position, backwards):
+        if hasattr(self.object_list, 'keyset'):
+            return self.object_list.keyset(
+                position, backwards, self.per_page + 1
+            )
+        return keyset(self.object_list, self.fields, position,
+                      backwards, self.per_page + 1)
+
+    def _page(self, rows, token, has_next, has_previous):
+        positions = [
+            tuple(getattr(row, field) for field in self.fields)
+            for row in rows[:1] + rows[-1:]
+        ]
+        return CursorPage(rows, token,
+                          positions[0] if positions else None,
+                          positions[-1] if positions else None,
+                          has_next, has_previous)
+
+    def get_page(self, token):
+        position = decode_cursor(token) if token else None
+        if position is None:
+            rows = self._keyset(None, False)
+            return self._page(rows[:self.per_page], '',
+                              has_next=len(rows) > self.per_page,
+                              has_previous=False)
+        pub_date, pk, backwards = position
+        rows = self._keyset((pub_date, pk), backwards)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            return self._page(rows[::-1], token,
+                              has_next=True, has_previous=more)
+        return self._page(rows, token, has_next=more, has_previous=True)
+
+
+def get_comments_page(comments, request):
+    """Страница комментариев, начиная с последних, одним запросом."""
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE,
+                                COMMENT_CURSOR_FIELDS)
+    return paginator.get_page(request.GET.get(COMMENTS_CURSOR_PARAM))
+
+
+def page_window(page_obj, window=PAGE_WINDOW):
+    """Номера страниц для навигации: первая, последняя и window страниц
+    по обе стороны от текущей; None на месте пропуска."""
+    last = page_obj.paginator.num_pages
+    number = page_obj.number
+    pages = sorted({1, last} | set(range(
+        max(1, number - window), min(last, number + window) + 1
+    )))
+    result = []
+    previous = 0
+    for page in pages:
+        if page - previous == 2:
+            result.append(previous + 1)
+        elif page - previous > 2:
+            result.append(None)
+        result.append(page)
+        previous = page
+    return result
 
 
-def get_paginator(posts, request):
-    paginator = Paginator(posts, POSTS_PER_PAGE)
+def get_paginator(posts, request, cursor_fields=CURSOR_FIELDS,
+                  count_key=None):
+    if cursor_fields and CURSOR_PARAM in request.GET:
+        paginator = CursorPaginator(posts, POSTS_PER_PAGE, cursor_fields)
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+    if count_key is None:
+        paginator = Paginator(posts, POSTS_PER_PAGE)
+    else:
+        paginator = CachedCountPaginator(posts, POSTS_PER_PAGE, count_key)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.page_window = page_window(page_obj)
     return page_obj
@@ -1,32 +1,114 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from urllib.parse import urlencode
+
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
 
+from . import thumbnails
+from .cache import (cache_feed, feed_condition, feed_context, get_or_404,
+                    is_missing, remember_missing)
 from .forms import PostForm, CommentForm
-from .models import Post, Group, Follow, User
-from .utils import get_paginator
+from .groups import get_group_or_404, registry
+from .models import Comment, Follow, Group, Post, User
+from .search import SearchResults
+from .timeline import Timeline
+from .uploads import bounded_uploads
+from .utils import (encode_cursor, feed_count_key, get_comments_page,
+                    get_paginator)
+
+
+def detail_scopes(request, post_id):
+    if is_missing(Post, pk=post_id):
+        return None
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is None:
+        remember_missing(Post, pk=post_id)
+        return None
+    scopes = [f'author:{post["author_id"]}']
+    if post['group_id']:
+        scopes.append(f'group:{post["group_id"]}')
+    return scopes
+
+
+def group_scopes(request, slug):
+    group = registry.by_slug(slug)
+    return None if group is None else [f'group:{group.pk}']
+
+
+def profile_scopes(request, username):
+    if is_missing(User, username=username):
+        return None
+    pk = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if pk is None:
+        remember_missing(User, username=username)
+        return None
+    return [f'author:{pk}']
+
+
+def follow_scopes(request):
+    authors = Follow.objects.filter(user=request.user).order_by(
+        'author_id'
+    ).values_list('author_id', flat=True)
+    return [f'author:{pk}' for pk in authors]
+
+
+@feed_condition(lambda request: ['index'])
+@cache_feed('index')
+def index(request):
+    posts = Post.objects.select_related('author').order_by(
+        '-pub_date', '-id'
+    )
+    page_obj = get_paginator(posts, request, count_key=feed_count_key('index'))
+    thumbnails.prefetch_variants(page_obj)
+    context = {
+        'page_obj': page_obj,
+        **feed_context('index'),
+    }
+    return render(request, 'posts/index.html', context)
 
 
-@cache_page(20, key_prefix='index_page')
-def index(request):
-    return render(request,
-                  'posts/index.html',
-                  {'page_obj': get_paginator(
-                   Post.objects.select_related('author',
-                                               'group').all(), request)})
+@feed_condition(lambda request: ['index'])
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = get_paginator(SearchResults(query), request,
+                             cursor_fields=None)
+    thumbnails.prefetch_variants(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
 
 
+@feed_condition(group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.group_posts.all()
+    group = get_group_or_404(slug)
+    posts = group.group_posts.select_related('author').order_by(
+        '-pub_date', '-id'
+    )
+    page_obj = get_paginator(
+        posts, request, count_key=feed_count_key('group', group.pk)
+    )
+    thumbnails.prefetch_variants(page_obj)
     context = {
         'group': group,
-        'page_obj': get_paginator(posts, request),
+        # Счётчик меняется через update() и в реестре не обновляется.
+        'posts_count': Group.objects.filter(pk=group.pk).values_list(
+            'posts_count', flat=True
+        ).first(),
+        'page_obj': page_obj,
+        **feed_context(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
 @login_required
+@bounded_uploads
 def post_create(request):
     form = PostForm(request.POST or None,
                     files=request.FILES or None
@@ -36,12 +118,14 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     form.save()
+    thumbnails.schedule_on_commit(post.image)
     return redirect('posts:profile', request.user)
 
 
 @login_required
+@bounded_uploads
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_or_404(Post, pk=post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -54,13 +138,19 @@ def post_edit(request, post_id):
             'is_edit': True,
         }
         return render(request, 'posts/create_post.html', context)
-    form.save()
+    post = form.save()
+    thumbnails.schedule_on_commit(post.image)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@feed_condition(detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all().select_related('author', 'post')
+    post = get_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    comments = get_comments_page(
+        post.comments.select_related('author'), request
+    )
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -70,12 +160,20 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@feed_condition(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.filter(author=author)
+    author = get_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts = author.posts.order_by('-pub_date', '-id')
+    page_obj = get_paginator(
+        posts, request, count_key=feed_count_key('author', author.pk)
+    )
+    thumbnails.prefetch_variants(page_obj)
     context = {
         'author': author,
-        'page_obj': get_paginator(posts, request),
+        'page_obj': page_obj,
+        **feed_context(f'author:{author.pk}'),
         'following':
             request.user.is_authenticated
             and request.user != author
@@ -84,23 +182,48 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@feed_condition(detail_scopes)
+def post_comments(request, post_id):
+    post = get_or_404(Post.objects.only('id'), pk=post_id)
+    comments = get_comments_page(
+        Comment.objects.filter(post=post).select_related('author'), request
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        if request.is_ajax():
+            return render(request, 'includes/comment_item.html',
+                          {'comment': comment}, status=201)
+    elif request.is_ajax():
+        return JsonResponse({'errors': form.errors}, status=400)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@feed_condition(follow_scopes)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    timeline = Timeline(request.user)
+    page_obj = get_paginator(timeline, request)
+    if timeline.truncated and not page_obj.has_next() and page_obj:
+        # Посты глубже FEED_MERGE_DEPTH доступны только по курсору.
+        last = page_obj[len(page_obj) - 1]
+        page_obj.continue_cursor = encode_cursor((last.pub_date, last.pk))
+    thumbnails.prefetch_variants(page_obj)
     context = {
-        'page_obj': get_paginator(posts, request),
+        'page_obj': page_obj,
     }
     return render(
         request, 'posts/follow.html', context)
@@ -111,14 +234,13 @@ def profile_follow(request, username):
     if request.user.username != username:
         Follow.objects.get_or_create(
             user=request.user,
-            author=get_object_or_404(User,
-                                     username=username))
+            author=get_or_404(User, username=username))
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    user = get_object_or_404(User, username=username)
+    user = get_or_404(User, username=username)
     Follow.objects.filter(user=request.user,
                           author=user).delete()
     return redirect('posts:profile', username=username)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кэша.
+
+    Запись сбрасывается при любом сохранении пользователя, в том числе
+    при смене пароля, поэтому хэш сессии сверяется с актуальным.
+    QuerySet.update() сигналов не шлёт: после него нужно удалить
+    user_key(pk) из кэша, иначе запись живёт до истечения
+    AUTH_USER_CACHE_TIMEOUT."""
+
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
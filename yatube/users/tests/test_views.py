@@ -0,0 +1,50 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import User
+
+ABOUT_URL = reverse('about:author')
+PASSWORD_CHANGE_URL = reverse('users:password_change')
+
+
+class CachedSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='auth', password='old-password-123'
+        )
+        self.client.login(username='auth', password='old-password-123')
+        self.client.get(ABOUT_URL)
+
+    def test_authenticated_request_without_queries(self):
+        """Сессия и пользователь берутся из кэша без запросов к базе."""
+        with self.assertNumQueries(0):
+            response = self.client.get(ABOUT_URL)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_logs_out_other_sessions(self):
+        """После смены пароля другие сессии пользователя завершаются."""
+        other = Client()
+        other.login(username='auth', password='old-password-123')
+        response = self.client.post(PASSWORD_CHANGE_URL, data={
+            'old_password': 'old-password-123',
+            'new_password1': 'new-password-456',
+            'new_password2': 'new-password-456',
+        })
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = other.get(ABOUT_URL)
+        self.assertFalse(response.context['user'].is_authenticated)
+        response = self.client.get(ABOUT_URL)
+        self.assertTrue(response.context['user'].is_authenticated)
+
+    def test_session_of_plain_model_backend_kept(self):
+        """Сессии, созданные до кэширующего бэкенда, не завершаются."""
+        other = Client()
+        other.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend'
+        )
+        response = other.get(ABOUT_URL)
+        self.assertEqual(response.context['user'], self.user)
@@ -95,6 +95,23 @@ DATABASES = {
 }
 
 
+# Сессии читаются из кэша и записываются и в кэш, и в базу;
+# пользователь сессии тоже берётся из кэша.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Новые входы записывают в сессию CachedModelBackend. ModelBackend
+# оставлен, пока живы сессии, созданные до кэша (SESSION_COOKIE_AGE),
+# иначе их владельцы будут разлогинены.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# Сохранение и удаление пользователя сбрасывают кэш сразу; изменения
+# через QuerySet.update(), в том числе пароля и is_active, видны
+# сессиям не позже чем через AUTH_USER_CACHE_TIMEOUT секунд.
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -144,13 +161,91 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки отдаёт core.views.serve_media. При MEDIA_OFFLOAD
+# ('x-accel-redirect' для nginx, 'x-sendfile' для Apache/lighttpd)
+# байты файла отдаёт прокси, а Django только проверяет запрос.
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Картинки постов пишутся на диск по частям не дальше
+# POST_IMAGE_MAX_UPLOAD_SIZE (posts.uploads.bounded_uploads); картинки
+# больше лимитов отклоняются по заголовку, а слишком крупные уменьшаются.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+
+# Поиск по постам: SQLite FTS5, если она есть, иначе обратный индекс
+# в таблице SearchTerm. После смены - manage.py rebuild_search_index.
+SEARCH_USE_FTS5 = True
+
+# Миниатюры создаются фоновыми потоками после загрузки картинки;
+# до этого шаблоны показывают исходную картинку.
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BatchKVStore'
+THUMBNAIL_IN_BACKGROUND = True
+THUMBNAIL_WORKERS = 2
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+            # L1 сверяется с журналом L2 не чаще раза в секунду: значение,
+            # изменённое другим процессом или потоком, может читаться
+            # из L1 устаревшим до SYNC_INTERVAL секунд.
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.AtomicFileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+    'missing': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'missing'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+# manage.py test держит файловые кэши во временном каталоге.
+TEST_RUNNER = 'core.runner.TempCacheRunner'
+
+# Авторы, у которых подписчиков больше порога, не раскладывают посты
+# по лентам подписчиков: их посты подмешиваются в ленту при чтении.
+FEED_PULL_THRESHOLD = 1000
+# Такая лента с номерами страниц сливает не больше FEED_MERGE_DEPTH
+# последних постов; более старые доступны в курсорном режиме.
+FEED_MERGE_DEPTH = 1000
+
+# Общее число записей ленты для пагинатора берётся из кэша; выше порога
+# для ленты без фильтров вместо COUNT(*) используется оценка.
+FEED_COUNT_TIMEOUT = 60 * 60
+FEED_COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Страницы и фрагменты лент кэшируются под версией ленты, которая
+# меняется при каждой записи, поэтому срок жизни может быть большим.
+FEED_CACHE_TIMEOUT = 60 * 60
+# Карточка поста кэшируется по id и дате изменения поста.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+# Устаревшую страницу ленты пересобирает один запрос; остальные
+# получают старую копию или ждут не дольше FEED_LOCK_TIMEOUT секунд.
+FEED_LOCK_TIMEOUT = 10
+FEED_LOCK_POLL_INTERVAL = 0.05
+
+# Промахи поиска пользователей, групп и постов по URL запоминаются,
+# пока такой объект не будет создан, но не дольше этого срока.
+# Хранятся в отдельном ограниченном кэше MISSING_CACHE_ALIAS.
+MISSING_CACHE_TIMEOUT = 60 * 10
+MISSING_CACHE_ALIAS = 'missing'
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -13,11 +13,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 
+from core.views import serve_media
+
+MEDIA_PATH = re.escape(settings.MEDIA_URL.lstrip('/'))
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,6 +29,7 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts')),
+    re_path(rf'^{MEDIA_PATH}(?P<path>.+)$', serve_media, name='media'),
 ]
 
 handler403 = 'core.views.csrf_failure'
@@ -32,7 +37,4 @@ handler404 = 'core.views.page_not_found'
 
 if settings.DEBUG:
     import debug_toolbar
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)